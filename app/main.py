@@ -1,15 +1,18 @@
 import os
+import asyncio
+import importlib
 import tempfile
 import shutil
 import uuid
 import traceback
 import json
+import orjson
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from dotenv import load_dotenv
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Body, status, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, validator
 from enum import Enum
@@ -17,16 +20,20 @@ import uvicorn
 
 from clients.supabase_client import supabase
 from langchain_core.documents import Document
+from chromadb.errors import ChromaError
 
 from core.extraction import extract_pdf_multimodal_with_supabase
-from core.store import ChromaConfig, store_to_chroma
+from core.store import ChromaConfig, store_to_chroma, clear_store_cache
 from core.retrieval import (
     RetrievalConfig, 
     retrieve_multimodal,
     format_result_with_sources,
-    get_unique_source_pdfs
+    get_unique_source_pdfs,
+    invalidate_retrieval_cache,
+    clear_retriever_cache,
+    get_persistent_client
 )
-from core.generation import GenerationConfig, generate_answer
+from core.generation import GenerationConfig, agenerate_answer, agenerate_answer_stream
 from config.logger_config import setup_logger, get_logger
 import time
 
@@ -42,6 +49,7 @@ class Settings:
     SUPABASE_IMAGE_BUCKET: str = os.getenv("SUPABASE_IMAGE_BUCKET", "rag-images")
     SUPABASE_DOCUMENT_BUCKET: str = os.getenv("SUPABASE_DOCUMENT_BUCKET", "rag-documents")
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "openai").lower()
     LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
     VISION_MODEL: str = os.getenv("VISION_MODEL", "gpt-4o")
     MAX_FILE_SIZE_MB: int = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
@@ -53,6 +61,10 @@ class Settings:
         errors = []
         if not self.OPENAI_API_KEY:
             errors.append("OPENAI_API_KEY is required")
+        if self.EMBEDDING_BACKEND not in ("openai", "fastembed"):
+            errors.append(f"EMBEDDING_BACKEND must be 'openai' or 'fastembed', got '{self.EMBEDDING_BACKEND}'")
+        elif self.EMBEDDING_BACKEND == "fastembed" and self.EMBEDDING_MODEL.startswith("text-embedding-"):
+            errors.append(f"EMBEDDING_MODEL '{self.EMBEDDING_MODEL}' is an OpenAI model; set it to a FastEmbed model (e.g. BAAI/bge-small-en-v1.5) when EMBEDDING_BACKEND=fastembed")
         
         if errors:
             raise ValueError(f"Configuration errors: {', '.join(errors)}")
@@ -69,13 +81,15 @@ try:
     chroma_config = ChromaConfig(
         openai_api_key=settings.OPENAI_API_KEY,
         chroma_persist_directory=settings.CHROMA_PERSIST_DIR,
-        embedding_model=settings.EMBEDDING_MODEL
+        embedding_model=settings.EMBEDDING_MODEL,
+        embedding_backend=settings.EMBEDDING_BACKEND
     )
     
     retrieval_config = RetrievalConfig(
         openai_api_key=settings.OPENAI_API_KEY,
         chroma_persist_directory=settings.CHROMA_PERSIST_DIR,
-        embedding_model=settings.EMBEDDING_MODEL
+        embedding_model=settings.EMBEDDING_MODEL,
+        embedding_backend=settings.EMBEDDING_BACKEND
     )
     
     generation_config = GenerationConfig(
@@ -245,6 +259,7 @@ app = FastAPI(
     version="3.1.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     responses={
         500: {"model": ErrorResponse},
         400: {"model": ErrorResponse},
@@ -264,7 +279,7 @@ app.add_middleware(
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     request_logger.warning(f"HTTP {exc.status_code}: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(
             error=exc.detail,
@@ -277,7 +292,7 @@ async def http_exception_handler(request, exc):
 async def general_exception_handler(request, exc):
     request_logger.exception("Unhandled exception")
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content=ErrorResponse(
             error="Internal server error",
@@ -314,24 +329,57 @@ def validate_file(file: UploadFile) -> tuple[bool, str]:
     return True, "OK"
 
 
+async def probe_supabase_buckets():
+    await asyncio.gather(*(
+        asyncio.to_thread(supabase.storage.from_(bucket).list, path="", options={"limit": 1})
+        for bucket in (settings.SUPABASE_IMAGE_BUCKET, settings.SUPABASE_DOCUMENT_BUCKET)
+    ))
+
+
+def build_retrieval_kwargs(request: QueryRequest) -> Dict[str, Any]:
+    retrieval_kwargs = {"k": request.k}
+    
+    if request.retrieval_method == "all":
+        retrieval_kwargs.update({
+            "k_text": request.k_text,
+            "k_images": request.k_images,
+            "k_tables": request.k_tables
+        })
+    elif request.retrieval_method == "hybrid":
+        retrieval_kwargs.update({
+            "text_weight": request.text_weight,
+            "image_weight": request.image_weight,
+            "table_weight": request.table_weight
+        })
+    elif request.retrieval_method == "mmr":
+        retrieval_kwargs.update({
+            "lambda_mult": request.lambda_mult,
+            "fetch_k": request.k * 3
+        })
+    
+    return retrieval_kwargs
+
+
+def build_generation_config(use_vision: bool) -> GenerationConfig:
+    return GenerationConfig(
+        openai_api_key=settings.OPENAI_API_KEY,
+        model=settings.LLM_MODEL,
+        temperature=0.7,
+        max_tokens=2000,
+        use_vision=use_vision,
+        vision_model=settings.VISION_MODEL
+    )
+
+
 def get_collection_count(collection_name: str) -> int:
     try:
-        from langchain_chroma import Chroma
-        from langchain_openai import OpenAIEmbeddings
-        
-        embeddings = OpenAIEmbeddings(
-            model=settings.EMBEDDING_MODEL,
-            openai_api_key=settings.OPENAI_API_KEY
-        )
-        
-        store = Chroma(
-            collection_name=collection_name,
-            embedding_function=embeddings,
-            persist_directory=settings.CHROMA_PERSIST_DIR
-        )
+        try:
+            collection = get_persistent_client(settings.CHROMA_PERSIST_DIR).get_collection(name=collection_name)
+        except (ValueError, ChromaError):
+            logger.debug(f"Collection {collection_name} does not exist yet")
+            return 0
         
-        result = store.get()
-        count = len(result['ids']) if result and 'ids' in result else 0
+        count = collection.count()
         logger.debug(f"Collection {collection_name}: {count} documents")
         return count
     except Exception as e:
@@ -358,6 +406,7 @@ async def root():
             "health": "GET /health",
             "upload": "POST /api/v1/upload",
             "query": "POST /api/v1/query",
+            "query_stream": "POST /api/v1/query/stream",
             "stats": "GET /api/v1/stats",
             "documents": "POST /api/v1/documents",
             "delete_collection": "DELETE /api/v1/collections",
@@ -379,26 +428,14 @@ async def health_check():
     }
     
     try:
-        supabase.storage.from_(settings.SUPABASE_IMAGE_BUCKET).list(path="", options={"limit": 1})
-        supabase.storage.from_(settings.SUPABASE_DOCUMENT_BUCKET).list(path="", options={"limit": 1})
+        await probe_supabase_buckets()
         services_status["supabase"] = True
         logger.debug("Supabase connection OK")
     except Exception as e:
         logger.error(f"Supabase health check failed: {str(e)}")
     
     try:
-        from langchain_chroma import Chroma
-        from langchain_openai import OpenAIEmbeddings
-        
-        embeddings = OpenAIEmbeddings(
-            model=settings.EMBEDDING_MODEL,
-            openai_api_key=settings.OPENAI_API_KEY
-        )
-        Chroma(
-            collection_name="documents_text",
-            embedding_function=embeddings,
-            persist_directory=settings.CHROMA_PERSIST_DIR
-        )
+        get_persistent_client(settings.CHROMA_PERSIST_DIR).heartbeat()
         services_status["chromadb"] = True
         logger.debug("ChromaDB connection OK")
     except Exception as e:
@@ -508,7 +545,8 @@ async def upload_document(
                 config=chroma_config,
                 store_text=True,
                 store_images=upload_config.extract_images,
-                store_tables=upload_config.extract_tables
+                store_tables=upload_config.extract_tables,
+                include_stats=True
             )
         
         background_tasks.add_task(cleanup_temp_file, temp_pdf)
@@ -570,31 +608,11 @@ async def query_documents(request: QueryRequest = Body(...)):
         request_logger.debug(f"[{request_id}] Generation method: {request.generation_method}")
         request_logger.debug(f"[{request_id}] Vision: {request.use_vision if request.use_vision is not None else settings.USE_VISION}")
         
-        retrieval_kwargs = {"k": request.k}
-        
-        if request.retrieval_method == "all":
-            retrieval_kwargs.update({
-                "k_text": request.k_text,
-                "k_images": request.k_images,
-                "k_tables": request.k_tables
-            })
-        elif request.retrieval_method == "hybrid":
-            retrieval_kwargs.update({
-                "text_weight": request.text_weight,
-                "image_weight": request.image_weight,
-                "table_weight": request.table_weight
-            })
-        elif request.retrieval_method == "mmr":
-            retrieval_kwargs.update({
-                "lambda_mult": request.lambda_mult,
-                "fetch_k": request.k * 3
-            })
-        
         retrieval_result = retrieve_multimodal(
             query=request.query,
             config=retrieval_config,
             method=request.retrieval_method,
-            **retrieval_kwargs
+            **build_retrieval_kwargs(request)
         )
         
         results = retrieval_result.get("results", {})
@@ -632,20 +650,11 @@ async def query_documents(request: QueryRequest = Body(...)):
         
         use_vision = request.use_vision if request.use_vision is not None else settings.USE_VISION
         
-        gen_config = GenerationConfig(
-            openai_api_key=settings.OPENAI_API_KEY,
-            model=settings.LLM_MODEL,
-            temperature=0.7,
-            max_tokens=2000,
-            use_vision=use_vision,
-            vision_model=settings.VISION_MODEL
-        )
-        
         request_logger.info(f"[{request_id}] Generating answer...")
-        answer_result = generate_answer(
+        answer_result = await agenerate_answer(
             query=request.query,
             retrieval_results=results,
-            config=gen_config,
+            config=build_generation_config(use_vision),
             method=request.generation_method,
             language=request.language,
             include_sources=request.include_sources
@@ -675,6 +684,66 @@ async def query_documents(request: QueryRequest = Body(...)):
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
 
 
+@app.post("/api/v1/query/stream", tags=["Query"])
+async def query_documents_stream(request: QueryRequest = Body(...)):
+    request_id = str(uuid.uuid4())[:8]
+    request_logger.info(f"[{request_id}] Streaming query request: {request.query[:100]}...")
+    
+    if len(request.query) > settings.MAX_QUERY_LENGTH:
+        request_logger.warning(f"[{request_id}] Query too long")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query too long. Max: {settings.MAX_QUERY_LENGTH} chars"
+        )
+    
+    try:
+        retrieval_result = await asyncio.to_thread(
+            retrieve_multimodal,
+            query=request.query,
+            config=retrieval_config,
+            method=request.retrieval_method,
+            **build_retrieval_kwargs(request)
+        )
+    except Exception as e:
+        request_logger.exception(f"[{request_id}] Retrieval failed")
+        raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+    
+    results = retrieval_result.get("results", {})
+    use_vision = request.use_vision if request.use_vision is not None else settings.USE_VISION
+    
+    async def event_stream():
+        meta = {
+            "sources_count": {
+                "text": len(results.get("text", [])),
+                "images": len(results.get("images", [])),
+                "tables": len(results.get("tables", []))
+            },
+            "source_pdfs": get_unique_source_pdfs(retrieval_result) if request.include_source_pdfs else None
+        }
+        yield f"event: meta\ndata: {orjson.dumps(meta).decode()}\n\n"
+        
+        try:
+            async for chunk in agenerate_answer_stream(
+                query=request.query,
+                retrieval_results=results,
+                config=build_generation_config(use_vision),
+                language=request.language
+            ):
+                yield f"data: {orjson.dumps({'delta': chunk}).decode()}\n\n"
+            yield "data: [DONE]\n\n"
+            request_logger.info(f"[{request_id}] Streaming query completed")
+        except Exception as e:
+            request_logger.exception(f"[{request_id}] Streaming generation failed")
+            error = ErrorResponse(
+                error="Internal server error",
+                detail=str(e) if os.getenv("DEBUG") == "true" else None,
+                timestamp=datetime.utcnow().isoformat()
+            ).dict()
+            yield f"event: error\ndata: {orjson.dumps(error).decode()}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.get("/api/v1/stats", response_model=StatsResponse, tags=["Statistics"])
 async def get_statistics():
     logger.info("Statistics requested")
@@ -769,17 +838,14 @@ async def delete_collection(request: DeleteCollectionRequest = Body(...)):
         )
     
     try:
-        import chromadb
-        from chromadb.config import Settings as ChromaSettings
-        
-        client = chromadb.PersistentClient(
-            path=settings.CHROMA_PERSIST_DIR,
-            settings=ChromaSettings(anonymized_telemetry=False)
-        )
+        client = get_persistent_client(settings.CHROMA_PERSIST_DIR)
         
         count_before = get_collection_count(request.collection_name)
         
         client.delete_collection(name=request.collection_name)
+        invalidate_retrieval_cache()
+        clear_retriever_cache()
+        clear_store_cache()
         
         logger.warning(f"Deleted collection '{request.collection_name}' ({count_before} documents)")
         
@@ -823,6 +889,14 @@ async def delete_file(bucket: str, filename: str):
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
 
 
+async def preload_extraction_dependencies():
+    try:
+        await asyncio.to_thread(importlib.import_module, "unstructured.partition.pdf")
+        logger.info("Extraction dependencies preloaded")
+    except Exception as e:
+        logger.error(f"Failed to preload extraction dependencies: {str(e)}")
+
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("="*70)
@@ -839,11 +913,11 @@ async def startup_event():
     logger.info("="*70)
     
     os.makedirs(settings.CHROMA_PERSIST_DIR, exist_ok=True)
+    app.state.preload_task = asyncio.create_task(preload_extraction_dependencies())
     
     logger.info("Testing connections...")
     try:
-        supabase.storage.from_(settings.SUPABASE_IMAGE_BUCKET).list(path="", options={"limit": 1})
-        supabase.storage.from_(settings.SUPABASE_DOCUMENT_BUCKET).list(path="", options={"limit": 1})
+        await probe_supabase_buckets()
         logger.info("Supabase connection OK (both buckets)")
     except Exception as e:
         logger.error(f"Supabase connection failed: {str(e)}")
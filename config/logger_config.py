@@ -2,24 +2,7 @@ import logging
 import sys
 from pathlib import Path
 from datetime import datetime
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-
-
-class ColoredFormatter(logging.Formatter):
-    
-    COLORS = {
-        'DEBUG': '\033[36m',
-        'INFO': '\033[32m',
-        'WARNING': '\033[33m',
-        'ERROR': '\033[31m',
-        'CRITICAL': '\033[35m',
-    }
-    RESET = '\033[0m'
-    
-    def format(self, record):
-        if record.levelname in self.COLORS:
-            record.levelname = f"{self.COLORS[record.levelname]}{record.levelname}{self.RESET}"
-        return super().format(record)
+from logging.handlers import RotatingFileHandler
 
 
 def setup_logger(
@@ -36,20 +19,15 @@ def setup_logger(
     logger.setLevel(getattr(logging, log_level.upper()))
     logger.handlers.clear()
     
-    detailed_formatter = logging.Formatter(
+    formatter = logging.Formatter(
         fmt='%(asctime)s | %(name)s | %(levelname)-8s | %(filename)s:%(lineno)d | %(funcName)s() | %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     
-    simple_formatter = ColoredFormatter(
-        fmt='%(asctime)s | %(levelname)-8s | %(message)s',
-        datefmt='%H:%M:%S'
-    )
-    
     if log_to_console:
         console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(logging.DEBUG)
-        console_handler.setFormatter(simple_formatter)
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(formatter)
         logger.addHandler(console_handler)
     
     if log_to_file:
@@ -64,31 +42,8 @@ def setup_logger(
             encoding='utf-8'
         )
         file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(detailed_formatter)
+        file_handler.setFormatter(formatter)
         logger.addHandler(file_handler)
-        
-        error_log_file = log_path / f"{name}_errors.log"
-        error_handler = RotatingFileHandler(
-            error_log_file,
-            maxBytes=max_bytes,
-            backupCount=backup_count,
-            encoding='utf-8'
-        )
-        error_handler.setLevel(logging.ERROR)
-        error_handler.setFormatter(detailed_formatter)
-        logger.addHandler(error_handler)
-        
-        daily_log_file = log_path / f"{name}_daily.log"
-        daily_handler = TimedRotatingFileHandler(
-            daily_log_file,
-            when='midnight',
-            interval=1,
-            backupCount=30,
-            encoding='utf-8'
-        )
-        daily_handler.setLevel(logging.INFO)
-        daily_handler.setFormatter(detailed_formatter)
-        logger.addHandler(daily_handler)
     
     logger.propagate = False
     return logger
@@ -0,0 +1,22 @@
+import asyncio
+import threading
+from typing import Optional
+
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="core-sync-loop", daemon=True).start()
+            _background_loop = loop
+        return _background_loop
+
+
+def run_sync(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
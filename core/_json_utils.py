@@ -0,0 +1,10 @@
+import re
+import json
+from typing import Any
+
+
+_JSON_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def loads_fenced_json(text: str) -> Any:
+    return json.loads(_JSON_FENCE_PATTERN.sub("", text.strip()))
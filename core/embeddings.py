@@ -0,0 +1,56 @@
+import os
+import functools
+from typing import List, Optional, Protocol
+from config.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+_FASTEMBED_BATCH_SIZE = int(os.getenv("FASTEMBED_BATCH_SIZE", "256"))
+_FASTEMBED_THREADS = int(os.getenv("FASTEMBED_THREADS")) if os.getenv("FASTEMBED_THREADS") else None
+
+
+class EmbeddingBackend(Protocol):
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+    def embed_query(self, text: str) -> List[float]:
+        ...
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+
+class FastEmbedBackend:
+
+    def __init__(self, model_name: str, threads: Optional[int] = _FASTEMBED_THREADS):
+        from fastembed import TextEmbedding
+
+        supported = {model["model"].lower() for model in TextEmbedding.list_supported_models()}
+        if not model_name or model_name.lower() not in supported:
+            raise ValueError(
+                f"EMBEDDING_BACKEND=fastembed needs a FastEmbed model name in EMBEDDING_MODEL, got {model_name!r} "
+                f"(e.g. BAAI/bge-small-en-v1.5); OpenAI model names only work with EMBEDDING_BACKEND=openai"
+            )
+
+        logger.info("Loading FastEmbed model %s (ONNX Runtime, CPU)", model_name)
+        self.model_name = model_name
+        self._model = TextEmbedding(
+            model_name=model_name,
+            threads=threads,
+            providers=["CPUExecutionProvider"]
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self._model.embed(texts, batch_size=_FASTEMBED_BATCH_SIZE)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return next(iter(self._model.query_embed(text))).tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self._model.query_embed(texts, batch_size=_FASTEMBED_BATCH_SIZE)]
+
+
+@functools.lru_cache(maxsize=2)
+def get_fastembed_backend(model_name: str) -> FastEmbedBackend:
+    return FastEmbedBackend(model_name)
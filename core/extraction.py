@@ -1,16 +1,17 @@
 import os
+import logging
 from pathlib import Path
 from typing import List, Dict, Any, Optional
-from unstructured.partition.pdf import partition_pdf
-from unstructured.chunking.title import chunk_by_title
 from PIL import Image
-import uuid
+import secrets
 import tempfile
-import shutil
 import base64
 from io import BytesIO
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
+import httpx
+import openai
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, before_sleep_log
+from core._json_utils import loads_fenced_json
 from config.logger_config import get_logger
 import time
 
@@ -21,6 +22,40 @@ load_dotenv()
 
 logger = get_logger(__name__)
 
+_EXTRACTION_TMP_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None
+_IMAGE_DESCRIPTION_BATCH_SIZE = int(os.getenv("IMAGE_DESCRIPTION_BATCH_SIZE", "4"))
+_EXT_MIME = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+}
+
+_TRANSIENT_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, httpx.TransportError)
+
+_retry_transient = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, max=10),
+    retry=retry_if_exception_type(_TRANSIENT_ERRORS),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True
+)
+
+
+@_retry_transient
+def _invoke_vision(llm, message: HumanMessage):
+    return llm.invoke([message])
+
+
+@_retry_transient
+def _upload_to_storage(supabase, bucket_name: str, path: str, data: bytes, content_type: str):
+    return supabase.storage.from_(bucket_name).upload(
+        path=path,
+        file=data,
+        file_options={"content-type": content_type, "upsert": "true"}
+    )
+
 
 def encode_image_to_base64(image_path: str) -> str:
     with open(image_path, "rb") as image_file:
@@ -29,6 +64,8 @@ def encode_image_to_base64(image_path: str) -> str:
 
 def generate_image_description(image_path: str, openai_api_key: str,model: str = "gpt-4o",language: str = "Indonesian") -> Optional[str]:
 
+    from langchain_openai import ChatOpenAI
+
     model = os.getenv("MODEL_NAME_IMAGE_DESCRIPTION")
    
     try:
@@ -38,7 +75,8 @@ def generate_image_description(image_path: str, openai_api_key: str,model: str =
             model=model,
             openai_api_key=openai_api_key,
             max_tokens=500,
-            temperature=0.3
+            temperature=0.3,
+            max_retries=0
         )
         base64_image = encode_image_to_base64(image_path)
         
@@ -69,7 +107,7 @@ def generate_image_description(image_path: str, openai_api_key: str,model: str =
             ]
         )
 
-        response = llm.invoke([message])
+        response = _invoke_vision(llm, message)
         description = response.content
         
         logger.info(f"Description generated successfully ({len(description)} chars)")
@@ -80,25 +118,107 @@ def generate_image_description(image_path: str, openai_api_key: str,model: str =
         return None
 
 
+def _describe_image_batch(image_paths: List[str], openai_api_key: str, language: str = "Indonesian") -> Optional[List[str]]:
+
+    from langchain_openai import ChatOpenAI
+
+    model = os.getenv("MODEL_NAME_IMAGE_DESCRIPTION")
+
+    try:
+        logger.info(f"Generating descriptions for {len(image_paths)} images in one request")
+
+        llm = ChatOpenAI(
+            model=model,
+            openai_api_key=openai_api_key,
+            max_tokens=500 * len(image_paths),
+            temperature=0.3,
+            max_retries=0
+        )
+
+        if language == "Indonesian":
+            prompt = f"""Analisis {len(image_paths)} gambar berikut dengan detail. Untuk setiap gambar jelaskan:
+                                1. Jenis konten (chart, diagram, foto, ilustrasi, dll)
+                                2. Elemen-elemen utama yang ada
+                                3. Data atau informasi penting yang ditampilkan
+                                4. Konteks atau tujuan gambar
+
+                                Kembalikan HANYA JSON array berisi {len(image_paths)} string, di mana elemen ke-i adalah deskripsi gambar ke-i dalam bahasa Indonesia."""
+        else:
+            prompt = f"""Analyze the following {len(image_paths)} images in detail. For each image describe:
+                                1. Type of content (chart, diagram, photo, illustration, etc.)
+                                2. Main elements present
+                                3. Important data or information displayed
+                                4. Context or purpose of the image
+
+                                Return ONLY a JSON array of {len(image_paths)} strings, where element i describes image i."""
+
+        content = [{"type": "text", "text": prompt}]
+        for image_path in image_paths:
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{encode_image_to_base64(image_path)}"}
+            })
+
+        response = _invoke_vision(llm, HumanMessage(content=content))
+        descriptions = loads_fenced_json(response.content)
+
+        if not isinstance(descriptions, list) or len(descriptions) != len(image_paths) or not all(isinstance(d, str) for d in descriptions):
+            logger.warning(f"Batch description response malformed, expected {len(image_paths)} strings")
+            return None
+
+        logger.info(f"Batch descriptions generated successfully ({len(descriptions)} images)")
+        return descriptions
+
+    except Exception as e:
+        logger.warning(f"Batch description failed: {str(e)}")
+        return None
+
+
+def generate_image_descriptions_batch(image_paths: List[str], openai_api_key: str, model: str = "gpt-4o", language: str = "Indonesian", batch_size: int = _IMAGE_DESCRIPTION_BATCH_SIZE) -> Dict[str, Optional[str]]:
+
+    descriptions = {}
+
+    for start in range(0, len(image_paths), batch_size):
+        batch = image_paths[start:start + batch_size]
+
+        batch_descriptions = None
+        if len(batch) > 1:
+            batch_descriptions = _describe_image_batch(batch, openai_api_key, language)
+
+        if batch_descriptions is None:
+            if len(batch) > 1:
+                logger.info("Falling back to single-image description requests")
+            batch_descriptions = [
+                generate_image_description(
+                    image_path=image_path,
+                    openai_api_key=openai_api_key,
+                    model=model,
+                    language=language
+                )
+                for image_path in batch
+            ]
+
+        descriptions.update(zip(batch, batch_descriptions))
+
+    return descriptions
+
+
 def upload_image_to_supabase(local_image_path: str, supabase, bucket_name: str = "rag-images") -> Dict[str, str]:
     try:
         if not os.path.exists(local_image_path):
             logger.error(f"Image not found: {local_image_path}")
             raise FileNotFoundError(f"Image not found: {local_image_path}")
 
-        file_ext = Path(local_image_path).suffix
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
+        file_ext = os.path.splitext(local_image_path)[1].lower()
+        content_type = _EXT_MIME.get(file_ext, "application/octet-stream")
+        unique_filename = f"{secrets.token_hex(16)}{file_ext}"
         
-        logger.debug(f"Uploading image: {Path(local_image_path).name} -> {unique_filename}")
+        logger.debug(f"Uploading image: {os.path.basename(local_image_path)} -> {unique_filename}")
 
         with open(local_image_path, 'rb') as f:
             image_data = f.read()
 
-        response = supabase.storage.from_(bucket_name).upload(
-            path=unique_filename,
-            file=image_data,
-            file_options={"content-type": f"image/{file_ext.lstrip('.')}"}
-        )
+        _upload_to_storage(supabase, bucket_name, unique_filename, image_data, content_type)
 
         public_url = supabase.storage.from_(bucket_name).get_public_url(unique_filename)
         
@@ -122,10 +242,10 @@ def upload_pdf_to_supabase(local_pdf_path: str,supabase,bucket_name: str = "rag-
             raise FileNotFoundError(f"PDF not found: {local_pdf_path}")
 
         if custom_filename:
-            unique_filename = f"{uuid.uuid4()}_{custom_filename}"
+            unique_filename = f"{secrets.token_hex(16)}_{custom_filename}"
         else:
             original_name = Path(local_pdf_path).name
-            unique_filename = f"{uuid.uuid4()}_{original_name}"
+            unique_filename = f"{secrets.token_hex(16)}_{original_name}"
 
         file_size_mb = os.path.getsize(local_pdf_path) / 1024 / 1024
         logger.info(f"Uploading PDF to Supabase: {Path(local_pdf_path).name} ({file_size_mb:.2f} MB)")
@@ -133,11 +253,7 @@ def upload_pdf_to_supabase(local_pdf_path: str,supabase,bucket_name: str = "rag-
         with open(local_pdf_path, 'rb') as f:
             pdf_data = f.read()
 
-        response = supabase.storage.from_(bucket_name).upload(
-            path=unique_filename,
-            file=pdf_data,
-            file_options={"content-type": "application/pdf"}
-        )
+        _upload_to_storage(supabase, bucket_name, unique_filename, pdf_data, "application/pdf")
         public_url = supabase.storage.from_(bucket_name).get_public_url(unique_filename)
 
         result = {
@@ -158,191 +274,245 @@ def upload_pdf_to_supabase(local_pdf_path: str,supabase,bucket_name: str = "rag-
         return None
 
 
+def _element_metadata(element) -> Dict[str, Any]:
+    return element.metadata.to_dict() if hasattr(element, 'metadata') else {}
+
+
+def _attach_source_pdf(element_dict: Dict[str, Any], pdf_upload_result: Optional[Dict[str, str]]) -> None:
+    if pdf_upload_result:
+        element_dict["source_pdf_url"] = pdf_upload_result["public_url"]
+        element_dict["source_pdf_path"] = pdf_upload_result["storage_path"]
+
+
+def _build_element_dict(element_id: str, element, pdf_upload_result: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    element_dict = {
+        "id": element_id,
+        "type": element.category,
+        "content": str(element),
+        "metadata": _element_metadata(element)
+    }
+    _attach_source_pdf(element_dict, pdf_upload_result)
+    return element_dict
+
+
+def _build_image_dict(element_id: str, element, ai_description: Optional[str], upload_result: Dict[str, str], pdf_upload_result: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    metadata = _element_metadata(element)
+
+    if ai_description:
+        content = ai_description
+    else:
+        content = str(element) or f"Image from page {metadata.get('page_number', 'unknown')}"
+
+    element_dict = {
+        "id": element_id,
+        "type": element.category,
+        "content": content,
+        "metadata": metadata
+    }
+    _attach_source_pdf(element_dict, pdf_upload_result)
+
+    element_dict["supabase_url"] = upload_result["public_url"]
+    element_dict["storage_path"] = upload_result["storage_path"]
+    element_dict["ai_generated_description"] = bool(ai_description)
+    return element_dict
+
+
+def _build_table_dict(element_id: str, element, pdf_upload_result: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    table_text = str(element)
+
+    element_dict = {
+        "id": element_id,
+        "type": element.category,
+        "content": table_text,
+        "metadata": _element_metadata(element)
+    }
+    _attach_source_pdf(element_dict, pdf_upload_result)
+
+    element_dict["table_html"] = getattr(element.metadata, 'text_as_html', None)
+    element_dict["table_text"] = table_text
+    return element_dict
+
+
+def _handle_image(element, element_id: str, result: Dict[str, Any], context: Dict[str, Any]) -> None:
+    local_path = getattr(element.metadata, 'image_path', None)
+    if not local_path:
+        return
+
+    context["image_count"] += 1
+    image_count = context["image_count"]
+    logger.info(f"Processing image {image_count}: {Path(local_path).name}")
+
+    logger.debug("Uploading image to Supabase...")
+    upload_result = upload_image_to_supabase(local_path, context["supabase"], context["image_bucket_name"])
+
+    if upload_result:
+        result["images"].append(_build_image_dict(
+            element_id, element, context["image_descriptions"].get(local_path), upload_result, context["pdf_upload_result"]
+        ))
+        logger.info(f"Image {image_count} processed successfully")
+    else:
+        logger.warning(f"Failed to upload image {image_count}")
+
+
+def _handle_table(element, element_id: str, result: Dict[str, Any], context: Dict[str, Any]) -> None:
+    context["table_count"] += 1
+    logger.debug(f"Processing table {context['table_count']}")
+    result["tables"].append(_build_table_dict(element_id, element, context["pdf_upload_result"]))
+
+
+def _handle_formula(element, element_id: str, result: Dict[str, Any], context: Dict[str, Any]) -> None:
+    result["formulas"].append(_build_element_dict(element_id, element, context["pdf_upload_result"]))
+
+
+def _handle_text(element, element_id: str, result: Dict[str, Any], context: Dict[str, Any]) -> None:
+    result["text_chunks"].append(_build_element_dict(element_id, element, context["pdf_upload_result"]))
+
+
+_ELEMENT_HANDLERS = {
+    "Image": _handle_image,
+    "Table": _handle_table,
+    "Formula": _handle_formula,
+}
+
+
 def extract_pdf_multimodal_with_supabase(pdf_path: str,supabase,openai_api_key: str,image_bucket_name: str = "rag-images",document_bucket_name: str = "rag-documents",extract_images: bool = True,extract_tables: bool = True,
     strategy: str = "hi_res",chunk_content: bool = True,generate_image_descriptions: bool = True,description_language: str = "Indonesian",vision_model: str = "gpt-4o",upload_source_pdf: bool = True,custom_pdf_filename: Optional[str] = None
 ) -> Dict[str, Any]:
 
+    from unstructured.partition.pdf import partition_pdf
+    from unstructured.chunking.title import chunk_by_title
+
     if not os.path.exists(pdf_path):
         logger.error(f"PDF not found: {pdf_path}")
         raise FileNotFoundError(f"PDF not found: {pdf_path}")
 
-    temp_dir = tempfile.mkdtemp(prefix="pdf_extraction_")
-    images_dir = os.path.join(temp_dir, "images")
-    os.makedirs(images_dir, exist_ok=True)
-
     start_time = time.time()
 
-    try:
-        logger.info("="*80)
-        logger.info(f"Starting PDF extraction: {pdf_path}")
-        logger.info(f"Strategy: {strategy}, Extract images: {extract_images}, Extract tables: {extract_tables}")
-        logger.info(f"Generate descriptions: {generate_image_descriptions}, Language: {description_language}")
-        logger.info("="*80)
-        
-        pdf_upload_result = None
-        if upload_source_pdf:
-            pdf_upload_result = upload_pdf_to_supabase(local_pdf_path=pdf_path,supabase=supabase,bucket_name=document_bucket_name,custom_filename=custom_pdf_filename)
+    with tempfile.TemporaryDirectory(prefix="pdf_extraction_", dir=_EXTRACTION_TMP_ROOT) as temp_dir:
+        images_dir = os.path.join(temp_dir, "images")
+        os.makedirs(images_dir, exist_ok=True)
+
+        try:
+            logger.info("="*80)
+            logger.info(f"Starting PDF extraction: {pdf_path}")
+            logger.info(f"Strategy: {strategy}, Extract images: {extract_images}, Extract tables: {extract_tables}")
+            logger.info(f"Generate descriptions: {generate_image_descriptions}, Language: {description_language}")
+            logger.info("="*80)
         
-        logger.info("Extracting PDF elements...")
-        elements = partition_pdf(
-            filename=pdf_path,
-            strategy=strategy,
-            extract_images_in_pdf=extract_images,
-            extract_image_block_types=["Image", "Table"],
-            extract_image_block_output_dir=images_dir,
-            infer_table_structure=extract_tables,
-            chunking_strategy=None,
-            max_characters=10000,
-            overlap=200,
-        )
+            pdf_upload_result = None
+            if upload_source_pdf:
+                pdf_upload_result = upload_pdf_to_supabase(local_pdf_path=pdf_path,supabase=supabase,bucket_name=document_bucket_name,custom_filename=custom_pdf_filename)
         
-        logger.info(f"Extracted {len(elements)} elements from PDF")
-
-        result = {
-            "text_chunks": [],
-            "tables": [],
-            "images": [],
-            "formulas": [],
-            "metadata": {
-                "source": pdf_path,
-                "total_elements": len(elements),
-                "image_bucket": image_bucket_name,
-                "document_bucket": document_bucket_name
-            }
-        }
-
-        if pdf_upload_result:
-            result["metadata"]["source_pdf"] = pdf_upload_result
-            result["pdf_url"] = pdf_upload_result["public_url"]
-            result["pdf_storage_path"] = pdf_upload_result["storage_path"]
-            logger.debug(f"Source PDF stored: {pdf_upload_result['storage_path']}")
-
-        image_count = 0
-        table_count = 0
+            logger.info("Extracting PDF elements...")
+            elements = partition_pdf(
+                filename=pdf_path,
+                strategy=strategy,
+                extract_images_in_pdf=extract_images,
+                extract_image_block_types=["Image", "Table"],
+                extract_image_block_output_dir=images_dir,
+                infer_table_structure=extract_tables,
+                chunking_strategy=None,
+                max_characters=10000,
+                overlap=200,
+            )
         
-        for idx, element in enumerate(elements):
-            element_dict = {
-                "id": f"{Path(pdf_path).stem}_{idx}",
-                "type": element.category,
-                "content": str(element),
-                "metadata": element.metadata.to_dict() if hasattr(element, 'metadata') else {}
+            logger.info(f"Extracted {len(elements)} elements from PDF")
+
+            result = {
+                "text_chunks": [],
+                "tables": [],
+                "images": [],
+                "formulas": [],
+                "metadata": {
+                    "source": pdf_path,
+                    "total_elements": len(elements),
+                    "image_bucket": image_bucket_name,
+                    "document_bucket": document_bucket_name
+                }
             }
 
             if pdf_upload_result:
-                element_dict["source_pdf_url"] = pdf_upload_result["public_url"]
-                element_dict["source_pdf_path"] = pdf_upload_result["storage_path"]
-
-            if element.category == "Image":
-                if hasattr(element.metadata, 'image_path') and element.metadata.image_path:
-                    local_path = element.metadata.image_path
-                    image_count += 1
-
-                    logger.info(f"Processing image {image_count}: {Path(local_path).name}")
-                    
-                    ai_description = None
-                    if generate_image_descriptions:
-                        logger.debug("Generating AI description...")
-                        ai_description = generate_image_description(
-                            image_path=local_path,
-                            openai_api_key=openai_api_key,
-                            model=vision_model,
-                            language=description_language
-                        )
-                    
-                    logger.debug("Uploading image to Supabase...")
-                    upload_result = upload_image_to_supabase(local_path, supabase, image_bucket_name)
-
-                    if upload_result:
-                        element_dict["supabase_url"] = upload_result["public_url"]
-                        element_dict["storage_path"] = upload_result["storage_path"]
-                        
-                        if ai_description:
-                            element_dict["content"] = ai_description
-                            element_dict["ai_generated_description"] = True
-                        elif element_dict["content"]:
-                            element_dict["ai_generated_description"] = False
-                        else:
-                            page = element_dict["metadata"].get("page_number", "unknown")
-                            element_dict["content"] = f"Image from page {page}"
-                            element_dict["ai_generated_description"] = False
-                        
-                        result["images"].append(element_dict)
-                        logger.info(f"Image {image_count} processed successfully")
-                    else:
-                        logger.warning(f"Failed to upload image {image_count}")
-
-            elif element.category == "Table":
-                table_count += 1
-                logger.debug(f"Processing table {table_count}")
-                
-                if hasattr(element.metadata, 'text_as_html'):
-                    element_dict["table_html"] = element.metadata.text_as_html
-                else:
-                    element_dict["table_html"] = None
-
-                element_dict["table_text"] = str(element)
-                result["tables"].append(element_dict)
-
-            elif element.category == "Formula":
-                result["formulas"].append(element_dict)
-
-            else:
-                result["text_chunks"].append(element_dict)
-
-        if chunk_content and result["text_chunks"]:
-            logger.info("Performing semantic chunking on text elements...")
-            text_elements = [el for el in elements if el.category not in ["Table", "Image", "Formula"]]
-
-            if text_elements:
-                chunked = chunk_by_title(
-                    text_elements,
-                    max_characters=1000,
-                    combine_text_under_n_chars=200,
-                    new_after_n_chars=800,
-                )
+                result["metadata"]["source_pdf"] = pdf_upload_result
+                result["pdf_url"] = pdf_upload_result["public_url"]
+                result["pdf_storage_path"] = pdf_upload_result["storage_path"]
+                logger.debug(f"Source PDF stored: {pdf_upload_result['storage_path']}")
+
+            image_descriptions = {}
+            if generate_image_descriptions:
+                image_paths = [
+                    element.metadata.image_path for element in elements
+                    if element.category == "Image" and getattr(element.metadata, 'image_path', None)
+                ]
+                if image_paths:
+                    logger.info(f"Generating AI descriptions for {len(image_paths)} images...")
+                    image_descriptions = generate_image_descriptions_batch(
+                        image_paths=image_paths,
+                        openai_api_key=openai_api_key,
+                        model=vision_model,
+                        language=description_language
+                    )
+
+            pdf_stem = Path(pdf_path).stem
+            context = {
+                "supabase": supabase,
+                "image_bucket_name": image_bucket_name,
+                "pdf_upload_result": pdf_upload_result,
+                "image_descriptions": image_descriptions,
+                "image_count": 0,
+                "table_count": 0
+            }
 
-                result["text_chunks_semantic"] = []
-                for i, chunk in enumerate(chunked):
-                    chunk_dict = {
-                        "id": f"{Path(pdf_path).stem}_chunk_{i}",
-                        "content": str(chunk),
-                        "metadata": chunk.metadata.to_dict() if hasattr(chunk, 'metadata') else {}
-                    }
+            for idx, element in enumerate(elements):
+                handler = _ELEMENT_HANDLERS.get(element.category, _handle_text)
+                handler(element, f"{pdf_stem}_{idx}", result, context)
+
+            if chunk_content and result["text_chunks"]:
+                logger.info("Performing semantic chunking on text elements...")
+                text_elements = [el for el in elements if el.category not in _ELEMENT_HANDLERS]
+
+                if text_elements:
+                    chunked = chunk_by_title(
+                        text_elements,
+                        max_characters=1000,
+                        combine_text_under_n_chars=200,
+                        new_after_n_chars=800,
+                    )
+
+                    result["text_chunks_semantic"] = []
+                    for i, chunk in enumerate(chunked):
+                        chunk_dict = {
+                            "id": f"{pdf_stem}_chunk_{i}",
+                            "content": str(chunk),
+                            "metadata": chunk.metadata.to_dict() if hasattr(chunk, 'metadata') else {}
+                        }
                     
-                    if pdf_upload_result:
-                        chunk_dict["source_pdf_url"] = pdf_upload_result["public_url"]
-                        chunk_dict["source_pdf_path"] = pdf_upload_result["storage_path"]
+                        _attach_source_pdf(chunk_dict, pdf_upload_result)
                     
-                    result["text_chunks_semantic"].append(chunk_dict)
+                        result["text_chunks_semantic"].append(chunk_dict)
                 
-                logger.info(f"Created {len(result['text_chunks_semantic'])} semantic chunks")
+                    logger.info(f"Created {len(result['text_chunks_semantic'])} semantic chunks")
 
-        duration = time.time() - start_time
-        
-        logger.info("="*80)
-        logger.info("Extraction Summary:")
-        logger.info(f"  Text chunks: {len(result['text_chunks'])}")
-        logger.info(f"  Images: {len(result['images'])}")
-        if generate_image_descriptions:
-            ai_desc_count = sum(1 for img in result['images'] if img.get('ai_generated_description'))
-            logger.info(f"  Images with AI descriptions: {ai_desc_count}/{len(result['images'])}")
-        logger.info(f"  Tables: {len(result['tables'])}")
-        logger.info(f"  Formulas: {len(result['formulas'])}")
-        logger.info(f"  Total elements: {result['metadata']['total_elements']}")
-        logger.info(f"  Processing time: {duration:.2f}s")
-
-        if pdf_upload_result:
-            logger.debug(f"Source PDF URL: {pdf_upload_result['public_url'][:80]}...")
+            duration = time.time() - start_time
         
-        logger.info("="*80)
+            logger.info("="*80)
+            logger.info("Extraction Summary:")
+            logger.info(f"  Text chunks: {len(result['text_chunks'])}")
+            logger.info(f"  Images: {len(result['images'])}")
+            if generate_image_descriptions:
+                ai_desc_count = sum(1 for img in result['images'] if img.get('ai_generated_description'))
+                logger.info(f"  Images with AI descriptions: {ai_desc_count}/{len(result['images'])}")
+            logger.info(f"  Tables: {len(result['tables'])}")
+            logger.info(f"  Formulas: {len(result['formulas'])}")
+            logger.info(f"  Total elements: {result['metadata']['total_elements']}")
+            logger.info(f"  Processing time: {duration:.2f}s")
 
-        return result
+            if pdf_upload_result:
+                logger.debug(f"Source PDF URL: {pdf_upload_result['public_url'][:80]}...")
+        
+            logger.info("="*80)
 
-    except Exception as e:
-        logger.exception(f"Extraction failed for {pdf_path}")
-        raise
+            return result
 
-    finally:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-            logger.debug("Cleaned up temporary directory")
\ No newline at end of file
+        except Exception as e:
+            logger.exception(f"Extraction failed for {pdf_path}")
+            raise
@@ -1,19 +1,234 @@
+import io
 import os
-import re
+import json
 import base64
-import requests
-from typing import List, Dict, Any, Optional, Literal
-from dataclasses import dataclass
+import asyncio
+import hashlib
+import threading
+import functools
+import httpx
+import tiktoken
+from io import BytesIO
+from PIL import Image
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+from typing import Callable, List, Dict, Any, Optional, Tuple, Literal, AsyncIterator, Final
+from dataclasses import dataclass, astuple
+from openai import OpenAI
 from langchain_openai import ChatOpenAI
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableParallel
 from langchain_core.messages import HumanMessage
+from core._async_utils import run_sync
+from core._json_utils import loads_fenced_json
 from config.logger_config import get_logger
 import time
 
 logger = get_logger(__name__)
 
+_VISION_CONCURRENCY = 10
+_VISION_CACHE_SIZE = 512
+_VISION_MAX_OUTPUT_TOKENS = 1000
+_IMAGE_CACHE_SIZE = 64
+_BATCH_POLL_MAX_INTERVAL = 300
+_CONTEXT_BUDGET_SHARES = {"text": 0.6, "images": 0.2, "tables": 0.2}
+_BATCH_TERMINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+_MESSAGE_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+_SOURCE_COUNT_KEYS = {"text": "text", "image": "images", "table": "tables"}
+_CURLY_TRANS = str.maketrans({"{": "{{", "}": "}}"})
+
+
+VISION_BATCH_PROMPT_ID: Final[str] = """Analisis {count} gambar berikut dalam konteks pertanyaan: "{query}"
+
+                                    Untuk setiap gambar jelaskan secara detail:
+                                    1. Apa yang ditampilkan dalam gambar (chart, diagram, foto, dll)
+                                    2. Data atau informasi penting yang relevan dengan pertanyaan
+                                    3. Insight atau kesimpulan yang bisa diambil
+
+                                    Kembalikan HANYA JSON array dengan format [{{"index": 1, "analysis": "..."}}, ...], satu objek per gambar sesuai urutan gambar (index dimulai dari 1)."""
+
+VISION_BATCH_PROMPT_EN: Final[str] = """Analyze the following {count} images in the context of the question: "{query}"
+
+                                    For each image explain in detail:
+                                    1. What is shown in the image (chart, diagram, photo, etc.)
+                                    2. Important data or information relevant to the question
+                                    3. Insights or conclusions that can be drawn
+
+                                    Return ONLY a JSON array formatted as [{{"index": 1, "analysis": "..."}}, ...], one object per image in the order given (index starts at 1)."""
+
+VISION_PROMPT_ID: Final[str] = """Analisis gambar ini dalam konteks pertanyaan: "{query}"
+
+                                    Jelaskan secara detail:
+                                    1. Apa yang ditampilkan dalam gambar (chart, diagram, foto, dll)
+                                    2. Data atau informasi penting yang relevan dengan pertanyaan
+                                    3. Insight atau kesimpulan yang bisa diambil
+
+                                    Berikan analisis yang komprehensif dan fokus pada informasi yang relevan dengan pertanyaan."""
+
+VISION_PROMPT_EN: Final[str] = """Analyze this image in the context of the question: "{query}"
+
+                                    Explain in detail:
+                                    1. What is shown in the image (chart, diagram, photo, etc.)
+                                    2. Important data or information relevant to the question
+                                    3. Insights or conclusions that can be drawn
+
+                                    Provide comprehensive analysis focused on information relevant to the question."""
+
+SYSTEM_PROMPT_SIMPLE_ID: Final[str] = """Kamu adalah AI assistant yang ahli dalam menganalisis dokumen multimodal.
+
+                                Konteks yang diberikan berisi:
+                                - **TEXT**: Bagian text dari dokumen
+                                - **IMAGES**: Analisis visual real-time dari gambar/chart/diagram menggunakan vision AI
+                                - **TABLES**: Tabel dengan data terstruktur
+
+                                INSTRUKSI PENTING:
+                                1. Jawab pertanyaan user berdasarkan konteks yang diberikan
+                                2. Jika menyebutkan sumber, gunakan format: [TEXT-1], [IMAGE-2], [TABLE-3]
+                                3. Untuk IMAGES: Gambar telah dianalisis secara real-time. Gunakan analisis ini untuk memberikan insight yang akurat
+                                4. Jika ada data numerik atau tren dalam gambar, sebutkan dengan spesifik
+                                5. Jika konteks tidak cukup untuk menjawab, katakan dengan jelas
+                                6. Berikan jawaban yang lengkap, informatif, dan mudah dipahami
+                                7. Hindari frasa seperti "berdasarkan konteks" - langsung jawab saja"""
+
+SYSTEM_PROMPT_SIMPLE_EN: Final[str] = """You are an AI assistant expert in analyzing multimodal documents.
+
+                                The provided context contains:
+                                - **TEXT**: Text portions from the document
+                                - **IMAGES**: Real-time visual analysis of images/charts/diagrams using vision AI
+                                - **TABLES**: Tables with structured data
+
+                                IMPORTANT INSTRUCTIONS:
+                                1. Answer the user's question based on the provided context
+                                2. When citing sources, use format: [TEXT-1], [IMAGE-2], [TABLE-3]
+                                3. For IMAGES: Images have been analyzed in real-time. Use this analysis for accurate insights
+                                4. If there's numerical data or trends in images, mention them specifically
+                                5. If context is insufficient to answer, state this clearly
+                                6. Provide complete, informative, and easy-to-understand answers
+                                7. Avoid phrases like "based on context" - just answer directly"""
+
+SYSTEM_PROMPT_CITATIONS_ID: Final[str] = """Kamu adalah AI assistant yang memberikan jawaban dengan citations yang tepat.
+
+                                ATURAN CITATIONS:
+                                - Untuk text: [TEXT-1], [TEXT-2], dll
+                                - Untuk gambar: [IMAGE-1], [IMAGE-2], dll
+                                - Untuk tabel: [TABLE-1], [TABLE-2], dll
+
+                                PENTING untuk IMAGES:
+                                - Setiap IMAGE telah dianalisis secara real-time menggunakan vision AI
+                                - Gunakan analisis visual ini untuk memberikan insight akurat
+                                - SELALU tambahkan citation [IMAGE-X] setelah menjelaskan gambar
+
+                                JANGAN lupa tambahkan citation setelah SETIAP klaim/fakta!"""
+
+SYSTEM_PROMPT_CITATIONS_EN: Final[str] = """You are an AI assistant that provides answers with accurate citations.
+
+                                CITATION RULES:
+                                - For text: [TEXT-1], [TEXT-2], etc.
+                                - For images: [IMAGE-1], [IMAGE-2], etc.
+                                - For tables: [TABLE-1], [TABLE-2], etc.
+
+                                IMPORTANT for IMAGES:
+                                - Each IMAGE has been analyzed in real-time using vision AI
+                                - Use this visual analysis for accurate insights
+                                - ALWAYS add citation [IMAGE-X] after explaining the image
+
+                                DON'T forget to add citation after EVERY claim/fact!"""
+
+SYSTEM_PROMPT_STRUCTURED_ID: Final[str] = """Kamu adalah AI assistant yang memberikan jawaban terstruktur.
+
+                                Format jawaban:
+
+                                **RINGKASAN EKSEKUTIF**
+                                [Jawaban langsung dalam 2-3 kalimat]
+
+                                **TEMUAN UTAMA**
+                                1. [Poin pertama]
+                                2. [Poin kedua]
+                                3. [Dst...]
+
+                                **ANALISIS VISUAL**
+                                [Jelaskan gambar/chart yang relevan berdasarkan analisis real-time]
+
+                                **DATA PENDUKUNG**
+                                [Detail dari text/tabel]"""
+
+SYSTEM_PROMPT_STRUCTURED_EN: Final[str] = """You are an AI assistant providing structured answers.
+
+                                Answer format:
+
+                                **EXECUTIVE SUMMARY**
+                                [Direct answer in 2-3 sentences]
+
+                                **KEY FINDINGS**
+                                1. [First point]
+                                2. [Second point]
+                                3. [Etc...]
+
+                                **VISUAL ANALYSIS**
+                                [Explain relevant images/charts based on real-time analysis]
+
+                                **SUPPORTING DATA**
+                                [Details from text/tables]"""
+
+USER_TEMPLATE_SIMPLE: Final[str] = """Konteks:
+                           {context}
+
+                           Pertanyaan: {query}
+
+                           Jawaban:"""
+
+USER_TEMPLATE_CITATIONS: Final[str] = """Konteks:
+                            {context}
+
+                            Pertanyaan: {query}
+
+                            Jawab dengan inline citations:"""
+
+USER_TEMPLATE_STRUCTURED: Final[str] = """Konteks:
+                            {context}
+
+                            Pertanyaan: {query}
+
+                            Jawaban terstruktur:"""
+
+
+_PROMPT_TEXTS: Final[Dict[Tuple[str, str], Tuple[str, str]]] = {
+    ("simple", "indonesian"): (SYSTEM_PROMPT_SIMPLE_ID, USER_TEMPLATE_SIMPLE),
+    ("simple", "english"): (SYSTEM_PROMPT_SIMPLE_EN, USER_TEMPLATE_SIMPLE),
+    ("citations", "indonesian"): (SYSTEM_PROMPT_CITATIONS_ID, USER_TEMPLATE_CITATIONS),
+    ("citations", "english"): (SYSTEM_PROMPT_CITATIONS_EN, USER_TEMPLATE_CITATIONS),
+    ("structured", "indonesian"): (SYSTEM_PROMPT_STRUCTURED_ID, USER_TEMPLATE_STRUCTURED),
+    ("structured", "english"): (SYSTEM_PROMPT_STRUCTURED_EN, USER_TEMPLATE_STRUCTURED),
+}
+
+_PROMPTS: Final[Dict[Tuple[str, str], ChatPromptTemplate]] = {
+    key: ChatPromptTemplate.from_messages([("system", system_prompt), ("user", user_template)])
+    for key, (system_prompt, user_template) in _PROMPT_TEXTS.items()
+}
+
+
+class _LRUCache:
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
 
 @dataclass
 class GenerationConfig:
@@ -23,191 +238,513 @@ class GenerationConfig:
     max_tokens: int = 2000
     use_vision: bool = True 
     vision_model: str = os.getenv("VISION_MODEL") 
+    vision_detail: Literal["low", "high", "auto"] = "low"
+    vision_max_side: int = 1024
+    pass_url_directly: bool = True
+    vision_stagger_ms: int = 50
+    max_context_tokens: int = int(os.getenv("MAX_CONTEXT_TOKENS", "0"))
+
+
+@functools.lru_cache(maxsize=8)
+def _get_encoding(model: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        logger.debug("No tiktoken encoding registered for %s, using o200k_base", model)
+        return tiktoken.get_encoding("o200k_base")
+
+
+_llm_cache: "WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, ChatOpenAI]]" = WeakKeyDictionary()
+_llm_cache_lock = threading.Lock()
+
+
+def _get_llm(openai_api_key: str, model: str, temperature: float, max_tokens: int) -> ChatOpenAI:
+    key = (openai_api_key, model, temperature, max_tokens)
+    loop = asyncio.get_running_loop()
+
+    with _llm_cache_lock:
+        llms = _llm_cache.setdefault(loop, {})
+        llm = llms.get(key)
+        if llm is None:
+            logger.debug("Creating ChatOpenAI client: %s (temperature=%s, max_tokens=%s)", model, temperature, max_tokens)
+            llm = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                openai_api_key=openai_api_key
+            )
+            llms[key] = llm
+        return llm
+
+
+@functools.lru_cache(maxsize=1)
+def _get_http_client() -> httpx.Client:
+    return httpx.Client(
+        timeout=10.0,
+        transport=httpx.HTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+        )
+    )
+
+
+def _count_sources(sources: List[Dict[str, Any]]) -> Dict[str, int]:
+    counts = {"text": 0, "images": 0, "tables": 0}
+    for source in sources:
+        counts[_SOURCE_COUNT_KEYS[source["type"]]] += 1
+    return counts
 
 
 class MultimodalGenerator:
+    _vision_cache = _LRUCache(_VISION_CACHE_SIZE)
+    _image_cache = _LRUCache(_IMAGE_CACHE_SIZE)
+
     def __init__(self, config: GenerationConfig):
         self.config = config
 
         logger.info("Initializing Multimodal Generator...")
         
-        self.llm = ChatOpenAI(
-            model=config.model,
-            temperature=config.temperature,
-            max_tokens=config.max_tokens,
-            openai_api_key=config.openai_api_key
-        )
-
-        if config.use_vision:
-            self.vision_llm = ChatOpenAI(
-                model=config.vision_model,
-                temperature=0.3,
-                max_tokens=1000,
-                openai_api_key=config.openai_api_key
-            )
+        self._parser = StrOutputParser()
 
-        logger.info(f"Generator initialized - Text model: {config.model}")
+        logger.info("Generator initialized - Text model: %s", config.model)
         if config.use_vision:
-            logger.info(f"Vision model: {config.vision_model} (ENABLED)")
+            logger.info("Vision model: %s (ENABLED)", config.vision_model)
         else:
             logger.info("Vision analysis: DISABLED")
 
 
-    def _fetch_image_as_base64(self, url: str) -> Optional[str]:
+    @property
+    def llm(self) -> ChatOpenAI:
+        return _get_llm(self.config.openai_api_key, self.config.model, self.config.temperature, self.config.max_tokens)
+
+
+    @property
+    def vision_llm(self) -> ChatOpenAI:
+        return _get_llm(self.config.openai_api_key, self.config.vision_model, 0.3, _VISION_MAX_OUTPUT_TOKENS)
+
+
+    def _downscale_image(self, image_data: bytes, mime_type: str) -> Tuple[bytes, str]:
+
+        try:
+            with Image.open(BytesIO(image_data)) as image:
+                image.thumbnail((self.config.vision_max_side, self.config.vision_max_side), Image.LANCZOS)
+                if image.mode != "RGB":
+                    image = image.convert("RGB")
+
+                buffer = BytesIO()
+                image.save(buffer, format="JPEG", quality=85)
+
+            logger.debug("Image re-encoded: %s -> %s bytes", len(image_data), buffer.tell())
+            return buffer.getvalue(), "image/jpeg"
+
+        except Exception as e:
+            logger.warning("Image downscale failed, sending original bytes: %s", e)
+            return image_data, mime_type
+
+
+    def _fetch_image_as_data_url(self, url: str) -> Optional[str]:
         
+        cache_key = f"{self.config.vision_max_side}|{url}"
+        cached = self._image_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Image cache hit: %s...", url[:80])
+            return cached
+
         try:
-            logger.debug(f"Fetching image from URL: {url[:80]}...")
-            response = requests.get(url, timeout=10)
+            logger.debug("Fetching image from URL: %s...", url[:80])
+            response = _get_http_client().get(url)
             response.raise_for_status()
 
-            image_data = response.content
-            base64_image = base64.b64encode(image_data).decode('utf-8')
+            mime_type = response.headers.get("content-type", "image/jpeg").split(";")[0].strip()
+            image_data, mime_type = self._downscale_image(response.content, mime_type)
+            data_url = f"data:{mime_type};base64,{base64.b64encode(image_data).decode('ascii')}"
 
-            logger.debug(f"Image fetched successfully ({len(image_data)} bytes)")
-            return base64_image
+            logger.debug("Image fetched successfully (%s bytes, %s)", len(image_data), mime_type)
+            self._image_cache.put(cache_key, data_url)
+            return data_url
 
         except Exception as e:
-            logger.error(f"Failed to fetch image from {url[:80]}: {str(e)}", exc_info=True)
+            logger.error("Failed to fetch image from %s: %s", url[:80], e, exc_info=True)
             return None
 
 
-    def _analyze_image_with_vision(self,image_url: str,query: str,language: str = "Indonesian") -> Optional[str]:
-      
+    def _vision_cache_key(self, image_url: str, query: str, language: str) -> str:
+        return hashlib.blake2b(
+            f"{self.config.vision_model}|{self.config.vision_detail}|{self.config.vision_max_side}|{image_url}|{query}|{language}".encode(),
+            digest_size=16
+        ).hexdigest()
+
+
+    async def _aprefetch_images(self, image_urls: List[str]) -> List[Optional[str]]:
+
+        if self.config.pass_url_directly:
+            direct = [url if url.startswith("https://") else None for url in image_urls]
+        else:
+            direct = [None] * len(image_urls)
+
+        to_fetch = [url for url, ref in zip(image_urls, direct) if ref is None]
+        if not to_fetch:
+            logger.debug("Passing %s image URLs directly to the vision model", len(image_urls))
+            return direct
+
+        logger.debug("Prefetching %s images...", len(to_fetch))
+        data_urls = iter(await asyncio.gather(
+            *(asyncio.to_thread(self._fetch_image_as_data_url, url) for url in to_fetch)
+        ))
+        return [next(data_urls) if ref is None else ref for ref in direct]
+
+
+    async def _aanalyze_images(self,image_urls: Dict[int, str],query: str,language: str) -> Dict[int, str]:
+
+        analyses = {}
+        pending = {}
+        for i, url in image_urls.items():
+            cached = self._vision_cache.get(self._vision_cache_key(url, query, language))
+            if cached is not None:
+                analyses[i] = cached
+            else:
+                pending[i] = url
+
+        if analyses:
+            logger.debug("Vision cache hits: %s/%s", len(analyses), len(image_urls))
+
+        if not pending:
+            return analyses
+
+        image_refs = await self._aprefetch_images(list(pending.values()))
+        fetched = {i: image_ref for i, image_ref in zip(pending, image_refs) if image_ref}
+        if len(fetched) < len(pending):
+            logger.warning("Failed to fetch %s/%s images for vision analysis", len(pending) - len(fetched), len(pending))
+
+        if len(fetched) > 1:
+            batch = await self._aanalyze_images_batch(list(fetched.values()), query, language)
+            if batch is not None:
+                for i, analysis in zip(fetched, batch):
+                    analyses[i] = analysis
+                    self._vision_cache.put(self._vision_cache_key(pending[i], query, language), analysis)
+                return analyses
+            logger.warning("Batch vision analysis failed, falling back to per-image requests")
+
+        if fetched:
+            semaphore = asyncio.Semaphore(_VISION_CONCURRENCY)
+            stagger = self.config.vision_stagger_ms / 1000
+            tasks = []
+            for n, image_ref in enumerate(fetched.values()):
+                if n and stagger > 0:
+                    await asyncio.sleep(stagger)
+                tasks.append(asyncio.create_task(self._aanalyze_image_with_vision(image_ref, query, language, semaphore)))
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            for i, outcome in zip(fetched, outcomes):
+                if isinstance(outcome, Exception):
+                    logger.error("IMAGE-%s: vision analysis raised %r", i, outcome)
+                elif outcome:
+                    analyses[i] = outcome
+                    self._vision_cache.put(self._vision_cache_key(pending[i], query, language), outcome)
+
+        return analyses
+
+
+    async def _aanalyze_images_batch(self,image_refs: List[str],query: str,language: str = "Indonesian") -> Optional[List[str]]:
+
         try:
-            logger.info("Analyzing image with vision model...")
-            logger.debug(f"Image URL: {image_url[:80]}...")
-            logger.debug(f"Query context: {query[:100]}...")
+            logger.info("Analyzing %s images with a single vision request...", len(image_refs))
+
+            vision_prompt = (VISION_BATCH_PROMPT_ID if language.lower() == "indonesian" else VISION_BATCH_PROMPT_EN).format(count=len(image_refs), query=query)
 
-            base64_image = self._fetch_image_as_base64(image_url)
-            if not base64_image:
-                logger.warning("Failed to fetch image for vision analysis")
+            content = [{"type": "text", "text": vision_prompt}]
+            for image_ref in image_refs:
+                content.append({
+                    "type": "image_url",
+                    "image_url": {"url": image_ref, "detail": self.config.vision_detail}
+                })
+
+            vision_llm = self.vision_llm.bind(max_tokens=_VISION_MAX_OUTPUT_TOKENS * len(image_refs))
+            response = await vision_llm.ainvoke([HumanMessage(content=content)])
+            items = loads_fenced_json(response.content)
+
+            analyses = {
+                item["index"]: item["analysis"]
+                for item in items
+                if isinstance(item, dict) and isinstance(item.get("analysis"), str)
+            }
+            if sorted(analyses) != list(range(1, len(image_refs) + 1)):
+                logger.warning("Batch vision response malformed, expected %s analyses", len(image_refs))
                 return None
 
-            if language.lower() == "indonesian":
-                vision_prompt = f"""Analisis gambar ini dalam konteks pertanyaan: "{query}"
+            logger.info("Batch vision analysis completed (%s images)", len(analyses))
+            return [analyses[i] for i in range(1, len(image_refs) + 1)]
 
-                                    Jelaskan secara detail:
-                                    1. Apa yang ditampilkan dalam gambar (chart, diagram, foto, dll)
-                                    2. Data atau informasi penting yang relevan dengan pertanyaan
-                                    3. Insight atau kesimpulan yang bisa diambil
+        except Exception as e:
+            logger.error("Batch vision analysis failed: %s", e, exc_info=True)
+            return None
 
-                                    Berikan analisis yang komprehensif dan fokus pada informasi yang relevan dengan pertanyaan."""
-            else:
-                vision_prompt = f"""Analyze this image in the context of the question: "{query}"
 
-                                    Explain in detail:
-                                    1. What is shown in the image (chart, diagram, photo, etc.)
-                                    2. Important data or information relevant to the question
-                                    3. Insights or conclusions that can be drawn
+    async def _aanalyze_image_with_vision(self,image_ref: str,query: str,language: str,semaphore: asyncio.Semaphore) -> Optional[str]:
 
-                                    Provide comprehensive analysis focused on information relevant to the question."""
+        async with semaphore:
+            return await self._aanalyze_image_with_vision_ref(image_ref, query, language)
+
+
+    async def _aanalyze_image_with_vision_ref(self,image_ref: str,query: str,language: str = "Indonesian") -> Optional[str]:
+      
+        try:
+            logger.info("Analyzing image with vision model...")
+            logger.debug("Query context: %s...", query[:100])
+
+            vision_prompt = (VISION_PROMPT_ID if language.lower() == "indonesian" else VISION_PROMPT_EN).format(query=query)
 
             message = HumanMessage(
                 content=[
                     {"type": "text", "text": vision_prompt},
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
+                        "image_url": {"url": image_ref, "detail": self.config.vision_detail}
                     }
                 ]
             )
             
-            response = self.vision_llm.invoke([message])
+            response = await self.vision_llm.ainvoke([message])
             analysis = response.content
 
-            logger.info(f"Vision analysis completed ({len(analysis)} chars)")
+            logger.info("Vision analysis completed (%s chars)", len(analysis))
             return analysis
 
         except Exception as e:
-            logger.error(f"Vision analysis failed: {str(e)}", exc_info=True)
+            logger.error("Vision analysis failed: %s", e, exc_info=True)
             return None
 
 
     def _escape_curly_braces(self, text: str) -> str:
-        if not text:
+        if not text or ("{" not in text and "}" not in text):
             return text
-        text = text.replace("{", "{{").replace("}", "}}")
-        return text
+        return text.translate(_CURLY_TRANS)
+
+
+    def _image_source(self, i: int, doc: Document, url: str, page: Any) -> Dict[str, Any]:
+        return {
+            "type": "image",
+            "id": f"IMAGE-{i}",
+            "description": doc.page_content,
+            "url": url,
+            "page": page,
+            "analyzed_with_vision": self.config.use_vision,
+            "metadata": doc.metadata
+        }
+
+
+    def _section_budgets(self, results: Dict[str, List[Document]]) -> Dict[str, Optional[int]]:
+
+        present = {section: share for section, share in _CONTEXT_BUDGET_SHARES.items() if results.get(section)}
+        if self.config.max_context_tokens <= 0 or not present:
+            return {section: None for section in _CONTEXT_BUDGET_SHARES}
+
+        total_share = sum(present.values())
+        return {
+            section: int(self.config.max_context_tokens * present[section] / total_share) if section in present else None
+            for section in _CONTEXT_BUDGET_SHARES
+        }
+
+
+    def _budget_gate(self, budget: Optional[int]) -> Callable[[str], bool]:
+
+        if budget is None:
+            return lambda block: True
+
+        encode = _get_encoding(self.config.model).encode
+        remaining = budget
+
+        def fits(block: str) -> bool:
+            nonlocal remaining
+            tokens = len(encode(block))
+            if tokens > remaining:
+                return False
+            remaining -= tokens
+            return True
+
+        return fits
+
+
+    def _images_within_budget(self, images: List[Document], budget: Optional[int]) -> int:
+
+        if budget is None:
+            return len(images)
+
+        encode = _get_encoding(self.config.model).encode
+        remaining = budget
+        for i, doc in enumerate(images, 1):
+            url = doc.metadata.get("supabase_url", "")
+            page = doc.metadata.get("img_page_number", "N/A")
+            tokens = len(encode(f"[IMAGE-{i}] (Page {page})\n\nVisual Analysis (Stored): {doc.page_content}\n\nURL: {url}\n\n"))
+            if url:
+                header = len(encode(f"[IMAGE-{i}] (Page {page})\n\nVisual Analysis (Real-time): \n\nURL: {url}\n\n"))
+                tokens = max(tokens, header + _VISION_MAX_OUTPUT_TOKENS)
+            if tokens > remaining:
+                return i - 1
+            remaining -= tokens
+        return len(images)
 
 
-    def _format_multimodal_context(self,results: Dict[str, List[Document]],query: str,use_vision: bool = True,language: str = "Indonesian") -> str:
+    def _format_vision_off(self, write: Callable[[str], int], images: List[Document], sources: List[Dict[str, Any]], fits: Callable[[str], bool]) -> int:
+
+        escape = self._escape_curly_braces
+        add_source = sources.append
+        for i, doc in enumerate(images, 1):
+            url = doc.metadata.get("supabase_url", "")
+            page = doc.metadata.get("img_page_number", "N/A")
+            block = f"[IMAGE-{i}] (Page {page})\n\nVisual Analysis: {escape(doc.page_content)}\n\nURL: {url}\n\n"
+            if not fits(block):
+                return len(images) - i + 1
+            write(block)
+            add_source(self._image_source(i, doc, url, page))
+        return 0
+
+
+    def _format_vision_on(self, write: Callable[[str], int], images: List[Document], vision_analyses: Dict[int, str], sources: List[Dict[str, Any]]) -> None:
+
+        for i, doc in enumerate(images, 1):
+            url = doc.metadata.get("supabase_url", "")
+            page = doc.metadata.get("img_page_number", "N/A")
+
+            vision_analysis = vision_analyses.get(i) if url else None
+            if vision_analysis:
+                label, description = "Visual Analysis (Real-time)", vision_analysis
+            elif url:
+                label, description = "Visual Analysis (Stored)", self._escape_curly_braces(doc.page_content)
+            else:
+                label, description = "Visual Analysis", self._escape_curly_braces(doc.page_content)
+
+            write(f"[IMAGE-{i}] (Page {page})\n\n{label}: {description}\n\nURL: {url}\n\n")
+            sources.append(self._image_source(i, doc, url, page))
+            logger.debug("IMAGE-%s: %s", i, label)
+
+
+    async def _aformat_multimodal_context(self,results: Dict[str, List[Document]],query: str,use_vision: bool = True,language: str = "Indonesian") -> Tuple[str, List[Dict[str, Any]]]:
        
         logger.info("Formatting multimodal context...")
         
-        context_parts = []
+        buf = io.StringIO()
+        write = buf.write
+        sources = []
+        dropped = 0
+        budgets = self._section_budgets(results)
         text_count = len(results.get("text", []))
         image_count = len(results.get("images", []))
         table_count = len(results.get("tables", []))
         
-        logger.debug(f"Context sources: {text_count} text, {image_count} images, {table_count} tables")
+        logger.debug("Context sources: %s text, %s images, %s tables", text_count, image_count, table_count)
 
         if results.get("text"):
-            context_parts.append("=== TEXT CONTENT ===\n")
+            write("=== TEXT CONTENT ===\n\n")
+            fits = self._budget_gate(budgets["text"])
             for i, doc in enumerate(results["text"], 1):
                 page = doc.metadata.get("chunk_page_number", "N/A")
-                content = self._escape_curly_braces(doc.page_content)
-                context_parts.append(
-                    f"[TEXT-{i}] (Page {page})\n{content}\n"
-                )
-
-        if results.get("images"):
-            context_parts.append("\n=== IMAGES ===\n")
-            for i, doc in enumerate(results["images"], 1):
-                url = doc.metadata.get("supabase_url", "")
-                page = doc.metadata.get("img_page_number", "N/A")
-
-                context_parts.append(f"[IMAGE-{i}] (Page {page})\n")
-
-                if use_vision and url and self.config.use_vision:
-                    logger.info(f"Processing IMAGE-{i} with vision model...")
-
-                    vision_analysis = self._analyze_image_with_vision(
-                        image_url=url,
-                        query=query,
-                        language=language
-                    )
-
-                    if vision_analysis:
-                        context_parts.append(f"Visual Analysis (Real-time): {vision_analysis}\n")
-                        logger.debug(f"IMAGE-{i}: Using real-time vision analysis")
-                    else:
-                        stored_desc = self._escape_curly_braces(doc.page_content)
-                        context_parts.append(f"Visual Analysis (Stored): {stored_desc}\n")
-                        logger.debug(f"IMAGE-{i}: Falling back to stored description")
-                else:
-                    stored_desc = self._escape_curly_braces(doc.page_content)
-                    context_parts.append(f"Visual Analysis: {stored_desc}\n")
-                    logger.debug(f"IMAGE-{i}: Using stored description (vision disabled)")
-
-                context_parts.append(f"URL: {url}\n")
+                block = f"[TEXT-{i}] (Page {page})\n{self._escape_curly_braces(doc.page_content)}\n\n"
+                if not fits(block):
+                    dropped += text_count - i + 1
+                    break
+                write(block)
+                sources.append({
+                    "type": "text",
+                    "id": f"TEXT-{i}",
+                    "content_preview": f"{doc.page_content[:200]}...",
+                    "page": page,
+                    "metadata": doc.metadata
+                })
+
+        images = results.get("images")
+        if images:
+            write("\n=== IMAGES ===\n\n")
+
+            if use_vision and self.config.use_vision:
+                in_budget = self._images_within_budget(images, budgets["images"])
+                dropped += len(images) - in_budget
+                images = images[:in_budget]
+                image_urls = {
+                    i: doc.metadata["supabase_url"]
+                    for i, doc in enumerate(images, 1)
+                    if doc.metadata.get("supabase_url")
+                }
+                vision_analyses = {}
+                if image_urls:
+                    logger.info("Processing %s images with vision model...", len(image_urls))
+                    vision_analyses = await self._aanalyze_images(image_urls, query, language)
+                self._format_vision_on(write, images, vision_analyses, sources)
+            else:
+                logger.debug("Using stored descriptions for %s images (vision disabled)", len(images))
+                dropped += self._format_vision_off(write, images, sources, self._budget_gate(budgets["images"]))
 
         if results.get("tables"):
-            context_parts.append("\n=== TABLES ===\n")
+            write("\n=== TABLES ===\n\n")
+            fits = self._budget_gate(budgets["tables"])
             for i, doc in enumerate(results["tables"], 1):
                 page = doc.metadata.get("table_page_number", "N/A")
                 has_html = doc.metadata.get("has_html", False)
-                content = self._escape_curly_braces(doc.page_content)
-                context_parts.append(
-                    f"[TABLE-{i}] (Page {page}, Format: {'HTML' if has_html else 'Plain Text'})\n"
-                    f"{content}\n"
-                )
+                block = f"[TABLE-{i}] (Page {page}, Format: {'HTML' if has_html else 'Plain Text'})\n{self._escape_curly_braces(doc.page_content)}\n\n"
+                if not fits(block):
+                    dropped += table_count - i + 1
+                    break
+                write(block)
+                sources.append({
+                    "type": "table",
+                    "id": f"TABLE-{i}",
+                    "content_preview": f"{doc.page_content[:300]}...",
+                    "page": page,
+                    "has_html": has_html,
+                    "metadata": doc.metadata
+                })
 
-        context = "\n".join(context_parts)
-        logger.info(f"Context formatted: {len(context)} chars total")
-        return context
+        if dropped:
+            logger.warning("Context token budget (%s) exceeded, dropped %s lowest-ranked documents", self.config.max_context_tokens, dropped)
 
-    def generate_simple(self,query: str,retrieval_results: Dict[str, List[Document]],include_sources: bool = True,language: str = "Indonesian") -> Dict[str, Any]:
+        logger.info("Context formatted: %s chars total, %s sources", buf.tell(), len(sources))
+        return buf.getvalue(), sources
+
+    def _chain(self, method: str, language: str):
+        return _PROMPTS[(method, "indonesian" if language.lower() == "indonesian" else "english")] | self.llm | self._parser
+
+
+    async def agenerate_simple_stream(self,query: str,retrieval_results: Dict[str, List[Document]],language: str = "Indonesian") -> AsyncIterator[str]:
+
+        logger.info("="*80)
+        logger.info("Streaming answer (simple method)")
+        logger.info("Query: '%s'", query)
+        logger.info("="*80)
+
+        context, _ = await self._aformat_multimodal_context(
+            retrieval_results,
+            query,
+            use_vision=self.config.use_vision,
+            language=language
+        )
+
+        if not context.strip():
+            logger.warning("No context available for generation")
+            yield "Maaf, saya tidak menemukan informasi yang relevan untuk menjawab pertanyaan Anda."
+            return
+
+        chain = self._chain("simple", language)
+
+        logger.info("Streaming text generation model output...")
+        async for chunk in chain.astream({
+            "context": context,
+            "query": self._escape_curly_braces(query)
+        }):
+            yield chunk
+
+
+    async def agenerate_simple(self,query: str,retrieval_results: Dict[str, List[Document]],include_sources: bool = True,language: str = "Indonesian") -> Dict[str, Any]:
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         logger.info("="*80)
         logger.info("Generating answer (simple method)")
-        logger.info(f"Query: '{query}'")
-        logger.info(f"Language: {language}")
-        logger.info(f"Vision: {'ENABLED' if self.config.use_vision else 'DISABLED'}")
+        logger.info("Query: '%s'", query)
+        logger.info("Language: %s", language)
+        logger.info("Vision: %s", 'ENABLED' if self.config.use_vision else 'DISABLED')
         logger.info("="*80)
 
-        context = self._format_multimodal_context(
+        context, sources = await self._aformat_multimodal_context(
             retrieval_results,
             query,
             use_vision=self.config.use_vision,
@@ -222,67 +759,21 @@ class MultimodalGenerator:
                 "sources": []
             }
         
-        if language.lower() == "indonesian":
-            system_prompt = """Kamu adalah AI assistant yang ahli dalam menganalisis dokumen multimodal.
-
-                                Konteks yang diberikan berisi:
-                                - **TEXT**: Bagian text dari dokumen
-                                - **IMAGES**: Analisis visual real-time dari gambar/chart/diagram menggunakan vision AI
-                                - **TABLES**: Tabel dengan data terstruktur
-
-                                INSTRUKSI PENTING:
-                                1. Jawab pertanyaan user berdasarkan konteks yang diberikan
-                                2. Jika menyebutkan sumber, gunakan format: [TEXT-1], [IMAGE-2], [TABLE-3]
-                                3. Untuk IMAGES: Gambar telah dianalisis secara real-time. Gunakan analisis ini untuk memberikan insight yang akurat
-                                4. Jika ada data numerik atau tren dalam gambar, sebutkan dengan spesifik
-                                5. Jika konteks tidak cukup untuk menjawab, katakan dengan jelas
-                                6. Berikan jawaban yang lengkap, informatif, dan mudah dipahami
-                                7. Hindari frasa seperti "berdasarkan konteks" - langsung jawab saja"""
-
-        else:
-            system_prompt = """You are an AI assistant expert in analyzing multimodal documents.
-
-                                The provided context contains:
-                                - **TEXT**: Text portions from the document
-                                - **IMAGES**: Real-time visual analysis of images/charts/diagrams using vision AI
-                                - **TABLES**: Tables with structured data
-
-                                IMPORTANT INSTRUCTIONS:
-                                1. Answer the user's question based on the provided context
-                                2. When citing sources, use format: [TEXT-1], [IMAGE-2], [TABLE-3]
-                                3. For IMAGES: Images have been analyzed in real-time. Use this analysis for accurate insights
-                                4. If there's numerical data or trends in images, mention them specifically
-                                5. If context is insufficient to answer, state this clearly
-                                6. Provide complete, informative, and easy-to-understand answers
-                                7. Avoid phrases like "based on context" - just answer directly"""
-
         escaped_query = self._escape_curly_braces(query)
 
-        user_template = """Konteks:
-                           {context}
-
-                           Pertanyaan: {query}
-
-                           Jawaban:"""
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("user", user_template)
-        ])
-
         try:
             logger.info("Invoking text generation model...")
-            chain = prompt | self.llm | StrOutputParser()
-            answer = chain.invoke({
+            chain = self._chain("simple", language)
+            answer = await chain.ainvoke({
                 "context": context,
                 "query": escaped_query
             })
             
-            duration = time.time() - start_time
-            logger.info(f"Answer generated successfully ({len(answer)} chars, {duration:.2f}s)")
+            duration = time.perf_counter() - start_time
+            logger.info("Answer generated successfully (%s chars, %.2fs)", len(answer), duration)
             
         except Exception as e:
-            logger.error(f"Generation failed: {str(e)}", exc_info=True)
+            logger.error("Generation failed: %s", e, exc_info=True)
             return {
                 "answer": f"Maaf, terjadi error saat generate jawaban: {str(e)}",
                 "has_context": True,
@@ -295,31 +786,26 @@ class MultimodalGenerator:
             "model": self.config.model,
             "vision_model": self.config.vision_model if self.config.use_vision else None,
             "language": language,
-            "sources_count": {
-                "text": len(retrieval_results.get("text", [])),
-                "images": len(retrieval_results.get("images", [])),
-                "tables": len(retrieval_results.get("tables", []))
-            }
+            "sources_count": _count_sources(sources)
         }
 
         if include_sources:
-            result["sources"] = self._extract_sources(retrieval_results)
-            logger.debug(f"Extracted {len(result['sources'])} sources")
+            result["sources"] = sources
 
         logger.info("="*80)
         return result
 
 
-    def generate_with_citations(self,query: str,retrieval_results: Dict[str, List[Document]],language: str = "Indonesian") -> Dict[str, Any]:
+    async def agenerate_with_citations(self,query: str,retrieval_results: Dict[str, List[Document]],language: str = "Indonesian") -> Dict[str, Any]:
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         logger.info("="*80)
         logger.info("Generating answer with citations")
-        logger.info(f"Query: '{query}'")
+        logger.info("Query: '%s'", query)
         logger.info("="*80)
 
-        context = self._format_multimodal_context(
+        context, sources = await self._aformat_multimodal_context(
             retrieval_results,
             query,
             use_vision=self.config.use_vision,
@@ -334,63 +820,21 @@ class MultimodalGenerator:
                 "sources": []
             }
 
-        if language.lower() == "indonesian":
-            system_prompt = """Kamu adalah AI assistant yang memberikan jawaban dengan citations yang tepat.
-
-                                ATURAN CITATIONS:
-                                - Untuk text: [TEXT-1], [TEXT-2], dll
-                                - Untuk gambar: [IMAGE-1], [IMAGE-2], dll
-                                - Untuk tabel: [TABLE-1], [TABLE-2], dll
-
-                                PENTING untuk IMAGES:
-                                - Setiap IMAGE telah dianalisis secara real-time menggunakan vision AI
-                                - Gunakan analisis visual ini untuk memberikan insight akurat
-                                - SELALU tambahkan citation [IMAGE-X] setelah menjelaskan gambar
-
-                                JANGAN lupa tambahkan citation setelah SETIAP klaim/fakta!"""
-
-        else:
-            system_prompt = """You are an AI assistant that provides answers with accurate citations.
-
-                                CITATION RULES:
-                                - For text: [TEXT-1], [TEXT-2], etc.
-                                - For images: [IMAGE-1], [IMAGE-2], etc.
-                                - For tables: [TABLE-1], [TABLE-2], etc.
-
-                                IMPORTANT for IMAGES:
-                                - Each IMAGE has been analyzed in real-time using vision AI
-                                - Use this visual analysis for accurate insights
-                                - ALWAYS add citation [IMAGE-X] after explaining the image
-
-                                DON'T forget to add citation after EVERY claim/fact!"""
-
         escaped_query = self._escape_curly_braces(query)
 
-        user_template = """Konteks:
-                            {context}
-
-                            Pertanyaan: {query}
-
-                            Jawab dengan inline citations:"""
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("user", user_template)
-        ])
-
         try:
             logger.info("Invoking text generation model with citations...")
-            chain = prompt | self.llm | StrOutputParser()
-            answer = chain.invoke({
+            chain = self._chain("citations", language)
+            answer = await chain.ainvoke({
                 "context": context,
                 "query": escaped_query
             })
             
-            duration = time.time() - start_time
-            logger.info(f"Answer with citations generated ({len(answer)} chars, {duration:.2f}s)")
+            duration = time.perf_counter() - start_time
+            logger.info("Answer with citations generated (%s chars, %.2fs)", len(answer), duration)
             
         except Exception as e:
-            logger.error(f"Generation failed: {str(e)}", exc_info=True)
+            logger.error("Generation failed: %s", e, exc_info=True)
             return {
                 "answer": f"Error: {str(e)}",
                 "has_context": True,
@@ -404,20 +848,20 @@ class MultimodalGenerator:
             "model": self.config.model,
             "vision_model": self.config.vision_model if self.config.use_vision else None,
             "language": language,
-            "sources": self._extract_sources_with_ids(retrieval_results)
+            "sources": sources
         }
 
 
-    def generate_structured(self,query: str,retrieval_results: Dict[str, List[Document]],language: str = "Indonesian") -> Dict[str, Any]:
+    async def agenerate_structured(self,query: str,retrieval_results: Dict[str, List[Document]],language: str = "Indonesian") -> Dict[str, Any]:
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         logger.info("="*80)
         logger.info("Generating structured answer")
-        logger.info(f"Query: '{query}'")
+        logger.info("Query: '%s'", query)
         logger.info("="*80)
 
-        context = self._format_multimodal_context(
+        context, sources = await self._aformat_multimodal_context(
             retrieval_results,
             query,
             use_vision=self.config.use_vision,
@@ -431,71 +875,21 @@ class MultimodalGenerator:
                 "has_context": False
             }
 
-        if language.lower() == "indonesian":
-            system_prompt = """Kamu adalah AI assistant yang memberikan jawaban terstruktur.
-
-                                Format jawaban:
-
-                                **RINGKASAN EKSEKUTIF**
-                                [Jawaban langsung dalam 2-3 kalimat]
-
-                                **TEMUAN UTAMA**
-                                1. [Poin pertama]
-                                2. [Poin kedua]
-                                3. [Dst...]
-
-                                **ANALISIS VISUAL**
-                                [Jelaskan gambar/chart yang relevan berdasarkan analisis real-time]
-
-                                **DATA PENDUKUNG**
-                                [Detail dari text/tabel]"""
-
-        else:
-            system_prompt = """You are an AI assistant providing structured answers.
-
-                                Answer format:
-
-                                **EXECUTIVE SUMMARY**
-                                [Direct answer in 2-3 sentences]
-
-                                **KEY FINDINGS**
-                                1. [First point]
-                                2. [Second point]
-                                3. [Etc...]
-
-                                **VISUAL ANALYSIS**
-                                [Explain relevant images/charts based on real-time analysis]
-
-                                **SUPPORTING DATA**
-                                [Details from text/tables]"""
-
         escaped_query = self._escape_curly_braces(query)
 
-        user_template = """Konteks:
-                            {context}
-
-                            Pertanyaan: {query}
-
-                            Jawaban terstruktur:"""
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("user", user_template)
-        ])
-
         try:
             logger.info("Invoking text generation model for structured output...")
-            chain = prompt | self.llm | StrOutputParser()
-            answer = chain.invoke({
+            chain = self._chain("structured", language)
+            answer = await chain.ainvoke({
                 "context": context,
                 "query": escaped_query
             })
             
-            duration = time.time() - start_time
-            logger.info(f"Structured answer generated ({len(answer)} chars, {duration:.2f}s)")
+            duration = time.perf_counter() - start_time
+            logger.info("Structured answer generated (%s chars, %.2fs)", len(answer), duration)
             
         except Exception as e:
-            logger.error(f"Generation failed: {str(e)}", exc_info=True)
+            logger.error("Generation failed: %s", e, exc_info=True)
             return {
                 "answer": f"Error: {str(e)}",
                 "has_context": True,
@@ -509,62 +903,98 @@ class MultimodalGenerator:
             "model": self.config.model,
             "vision_model": self.config.vision_model if self.config.use_vision else None,
             "language": language,
-            "sources": self._extract_sources(retrieval_results)
+            "sources": sources
         }
 
 
-    def _extract_sources(self, results: Dict[str, List[Document]]) -> List[Dict[str, Any]]:
-        logger.debug("Extracting sources from retrieval results...")
-        sources = []
+    async def agenerate_all_methods(self,query: str,retrieval_results: Dict[str, List[Document]],language: str = "Indonesian") -> Dict[str, Dict[str, Any]]:
 
-        for i, doc in enumerate(results.get("text", []), 1):
-            sources.append({
-                "type": "text",
-                "id": f"TEXT-{i}",
-                "content_preview": doc.page_content[:200] + "...",
-                "page": doc.metadata.get("chunk_page_number", "N/A"),
-                "metadata": doc.metadata
-            })
+        start_time = time.perf_counter()
 
-        for i, doc in enumerate(results.get("images", []), 1):
-            sources.append({
-                "type": "image",
-                "id": f"IMAGE-{i}",
-                "description": doc.page_content,
-                "url": doc.metadata.get("supabase_url", ""),
-                "page": doc.metadata.get("img_page_number", "N/A"),
-                "analyzed_with_vision": self.config.use_vision,
-                "metadata": doc.metadata
-            })
+        logger.info("="*80)
+        logger.info("Generating answers with all methods")
+        logger.info("Query: '%s'", query)
+        logger.info("="*80)
+
+        context, sources = await self._aformat_multimodal_context(
+            retrieval_results,
+            query,
+            use_vision=self.config.use_vision,
+            language=language
+        )
+
+        methods = ("simple", "citations", "structured")
+
+        if not context.strip():
+            logger.warning("No context available for generation")
+            return {
+                method: {"answer": "Maaf, saya tidak menemukan informasi yang relevan.", "has_context": False, "sources": []}
+                for method in methods
+            }
 
-        for i, doc in enumerate(results.get("tables", []), 1):
-            sources.append({
-                "type": "table",
-                "id": f"TABLE-{i}",
-                "content_preview": doc.page_content[:300] + "...",
-                "page": doc.metadata.get("table_page_number", "N/A"),
-                "has_html": doc.metadata.get("has_html", False),
-                "metadata": doc.metadata
+        try:
+            logger.info("Invoking text generation model for %s methods in parallel...", len(methods))
+            chain = RunnableParallel({method: self._chain(method, language) for method in methods})
+            answers = await chain.ainvoke({
+                "context": context,
+                "query": self._escape_curly_braces(query)
             })
 
-        logger.debug(f"Extracted {len(sources)} sources")
-        return sources
+            duration = time.perf_counter() - start_time
+            logger.info("All methods generated (%.2fs)", duration)
 
+        except Exception as e:
+            logger.error("Generation failed: %s", e, exc_info=True)
+            return {
+                method: {"answer": f"Error: {str(e)}", "has_context": True, "error": str(e)}
+                for method in methods
+            }
 
-    def _extract_sources_with_ids(self, results: Dict[str, List[Document]]) -> List[Dict[str, Any]]:
-        return self._extract_sources(results)
+        logger.info("="*80)
+        return {
+            method: {
+                "answer": answers[method],
+                "has_context": True,
+                "model": self.config.model,
+                "vision_model": self.config.vision_model if self.config.use_vision else None,
+                "language": language,
+                "sources": sources
+            }
+            for method in methods
+        }
 
 
-def generate_answer(query: str,retrieval_results: Dict[str, List[Document]],config: GenerationConfig,method: Literal["simple", "citations", "structured"] = "simple",language: str = "Indonesian",include_sources: bool = True) -> Dict[str, Any]:
+    def generate_simple(self,query: str,retrieval_results: Dict[str, List[Document]],include_sources: bool = True,language: str = "Indonesian") -> Dict[str, Any]:
+        return run_sync(self.agenerate_simple(query, retrieval_results, include_sources=include_sources, language=language))
+
+
+    def generate_with_citations(self,query: str,retrieval_results: Dict[str, List[Document]],language: str = "Indonesian") -> Dict[str, Any]:
+        return run_sync(self.agenerate_with_citations(query, retrieval_results, language=language))
+
+
+    def generate_structured(self,query: str,retrieval_results: Dict[str, List[Document]],language: str = "Indonesian") -> Dict[str, Any]:
+        return run_sync(self.agenerate_structured(query, retrieval_results, language=language))
+
+
+    def generate_all_methods(self,query: str,retrieval_results: Dict[str, List[Document]],language: str = "Indonesian") -> Dict[str, Dict[str, Any]]:
+        return run_sync(self.agenerate_all_methods(query, retrieval_results, language=language))
+
+
+@functools.lru_cache(maxsize=8)
+def _get_generator(config_key: tuple) -> MultimodalGenerator:
+    return MultimodalGenerator(GenerationConfig(*config_key))
+
+
+async def agenerate_answer(query: str,retrieval_results: Dict[str, List[Document]],config: GenerationConfig,method: Literal["simple", "citations", "structured"] = "simple",language: str = "Indonesian",include_sources: bool = True) -> Dict[str, Any]:
 
     logger.info("Initializing answer generation...")
-    logger.info(f"Method: {method}, Language: {language}")
+    logger.info("Method: %s, Language: %s", method, language)
     
-    generator = MultimodalGenerator(config)
+    generator = _get_generator(astuple(config))
 
     try:
         if method == "simple":
-            return generator.generate_simple(
+            return await generator.agenerate_simple(
                 query,
                 retrieval_results,
                 include_sources=include_sources,
@@ -572,28 +1002,154 @@ def generate_answer(query: str,retrieval_results: Dict[str, List[Document]],conf
             )
 
         elif method == "citations":
-            return generator.generate_with_citations(
+            return await generator.agenerate_with_citations(
                 query,
                 retrieval_results,
                 language=language
             )
 
         elif method == "structured":
-            return generator.generate_structured(
+            return await generator.agenerate_structured(
                 query,
                 retrieval_results,
                 language=language
             )
 
         else:
-            logger.error(f"Unknown generation method: {method}")
+            logger.error("Unknown generation method: %s", method)
             raise ValueError(f"Unknown method: {method}")
 
     except Exception as e:
-        logger.exception(f"Answer generation failed")
+        logger.exception("Answer generation failed")
         return {
             "answer": f"Maaf, terjadi error: {str(e)}",
             "has_context": False,
             "error": str(e)
         }
-        
\ No newline at end of file
+
+
+def generate_answer(query: str,retrieval_results: Dict[str, List[Document]],config: GenerationConfig,method: Literal["simple", "citations", "structured"] = "simple",language: str = "Indonesian",include_sources: bool = True) -> Dict[str, Any]:
+    return run_sync(agenerate_answer(query, retrieval_results, config, method=method, language=language, include_sources=include_sources))
+
+
+async def agenerate_answer_stream(query: str,retrieval_results: Dict[str, List[Document]],config: GenerationConfig,language: str = "Indonesian") -> AsyncIterator[str]:
+
+    logger.info("Initializing streaming answer generation...")
+
+    generator = _get_generator(astuple(config))
+    async for chunk in generator.agenerate_simple_stream(query, retrieval_results, language=language):
+        yield chunk
+
+
+def generate_answer_batch(queries: List[str],results_per_query: List[Dict[str, List[Document]]],config: GenerationConfig,method: Literal["simple", "citations", "structured"] = "simple",language: str = "Indonesian",poll_interval: float = 5.0) -> List[Dict[str, Any]]:
+
+    start_time = time.perf_counter()
+
+    logger.info("="*80)
+    logger.info("Generating %s answers with the OpenAI Batch API (method: %s)", len(queries), method)
+    logger.info("="*80)
+
+    if len(queries) != len(results_per_query):
+        raise ValueError(f"Got {len(queries)} queries but {len(results_per_query)} retrieval results")
+
+    generator = _get_generator(astuple(config))
+    prompt = _PROMPTS[(method, "indonesian" if language.lower() == "indonesian" else "english")]
+
+    async def _aformat_all():
+        return await asyncio.gather(*(
+            generator._aformat_multimodal_context(results, query, use_vision=config.use_vision, language=language)
+            for query, results in zip(queries, results_per_query)
+        ))
+
+    formatted = run_sync(_aformat_all())
+
+    answers: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+    sources_per_query = []
+    lines = []
+    for i, (query, (context, sources)) in enumerate(zip(queries, formatted)):
+        sources_per_query.append(sources)
+
+        if not context.strip():
+            answers[i] = {
+                "answer": "Maaf, saya tidak menemukan informasi yang relevan untuk menjawab pertanyaan Anda.",
+                "has_context": False,
+                "sources": []
+            }
+            continue
+
+        messages = prompt.format_messages(context=context, query=generator._escape_curly_braces(query))
+        lines.append(json.dumps({
+            "custom_id": f"q{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": config.model,
+                "temperature": config.temperature,
+                "max_tokens": config.max_tokens,
+                "messages": [{"role": _MESSAGE_ROLES[m.type], "content": m.content} for m in messages]
+            }
+        }))
+
+    if not lines:
+        logger.warning("No queries with context, skipping batch submission")
+        return answers
+
+    def _error(message: str) -> Dict[str, Any]:
+        return {"answer": f"Maaf, terjadi error: {message}", "has_context": True, "error": message}
+
+    try:
+        client = OpenAI(api_key=config.openai_api_key)
+
+        batch_file = client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info("Batch submitted: %s (%s requests)", batch.id, len(lines))
+
+        delay = poll_interval
+        while batch.status not in _BATCH_TERMINAL_STATUSES:
+            time.sleep(delay)
+            delay = min(delay * 2, _BATCH_POLL_MAX_INTERVAL)
+            batch = client.batches.retrieve(batch.id)
+            logger.debug("Batch %s status: %s", batch.id, batch.status)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+        outputs = {}
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if line.strip():
+                item = json.loads(line)
+                outputs[item["custom_id"]] = item
+
+    except Exception as e:
+        logger.error("Batch generation failed: %s", e, exc_info=True)
+        return [answer if answer is not None else _error(str(e)) for answer in answers]
+
+    for i, sources in enumerate(sources_per_query):
+        if answers[i] is not None:
+            continue
+
+        item = outputs.get(f"q{i}")
+        response = (item or {}).get("response") or {}
+        if response.get("status_code") != 200:
+            error = (item or {}).get("error") or response.get("body", {}).get("error") or "missing batch output"
+            logger.error("q%s: batch request failed: %s", i, error)
+            answers[i] = _error(str(error))
+            continue
+
+        answers[i] = {
+            "answer": response["body"]["choices"][0]["message"]["content"],
+            "has_context": True,
+            "model": config.model,
+            "vision_model": config.vision_model if config.use_vision else None,
+            "language": language,
+            "sources": sources
+        }
+
+    duration = time.perf_counter() - start_time
+    logger.info("Batch generation completed: %s/%s answers (%.2fs)", sum('error' not in a for a in answers), len(answers), duration)
+    logger.info("="*80)
+    return answers
@@ -1,22 +1,273 @@
 import os
-from typing import List, Dict, Any, Literal, Optional
-from dataclasses import dataclass
+import re
+import copy
+import json
+import heapq
+import functools
+import httpx
+import numpy as np
+import threading
+from collections import OrderedDict
+from itertools import chain
+from operator import itemgetter
+from typing import Callable, List, Dict, Any, Literal, Optional, Tuple
+from dataclasses import dataclass, astuple
+from concurrent.futures import ThreadPoolExecutor, Future
 from langchain_openai import OpenAIEmbeddings
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+from chromadb.errors import ChromaError
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from core.embeddings import get_fastembed_backend
 from config.logger_config import get_logger
 import time
 
 logger = get_logger(__name__)
 
-@dataclass
+_STORE_LABELS = {"text": "Text", "images": "Image", "tables": "Table"}
+_TYPE_TO_KEY = {"text": "text", "image": "images", "table": "tables"}
+_EMBEDDING_CACHE_SIZE = 2048
+_EMBEDDING_CACHE_TTL = 3600
+_RESULT_CACHE_SIZE = 256
+_RESULT_CACHE_TTL = 300
+_RRF_K = 60
+_EMBEDDING_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+_DEFAULT_PREFETCH = 20
+_RERANK_FETCH_MULTIPLIER = 3
+_KEYWORD_BLEND = 0.5
+_WORD_PATTERN = re.compile(r"\w+")
+_CHROMA_MEMORY_LIMIT_BYTES = int(os.environ.get("CHROMA_MEMORY_LIMIT_BYTES", "0"))
+_CHROMA_SETTINGS = ChromaSettings(
+    anonymized_telemetry=False,
+    **({"chroma_segment_cache_policy": "LRU", "chroma_memory_limit_bytes": _CHROMA_MEMORY_LIMIT_BYTES} if _CHROMA_MEMORY_LIMIT_BYTES > 0 else {})
+)
+
+
+class _TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def contains(self, key: Any) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self._ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "size": len(self._data),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else 0.0
+            }
+
+
+_shared_clients: Dict[Tuple[str, str], Any] = {}
+_shared_clients_lock = threading.Lock()
+_retriever_cache: Dict[tuple, "MultimodalRetriever"] = {}
+_retriever_lock = threading.Lock()
+_embedding_cache = _TTLCache(_EMBEDDING_CACHE_SIZE, _EMBEDDING_CACHE_TTL)
+_result_cache = _TTLCache(_RESULT_CACHE_SIZE, _RESULT_CACHE_TTL)
+_candidate_cache = _TTLCache(_RESULT_CACHE_SIZE, _RESULT_CACHE_TTL)
+
+
+_search_failures = threading.local()
+
+
+def _record_search_failure() -> None:
+    _search_failures.count = getattr(_search_failures, "count", 0) + 1
+
+
+def _search_failure_count() -> int:
+    return getattr(_search_failures, "count", 0)
+
+
+def _settings_key(settings: ChromaSettings) -> str:
+    dump = getattr(settings, "model_dump", None) or settings.dict
+    return json.dumps(dump(), sort_keys=True, default=str)
+
+
+def get_persistent_client(persist_directory: str, settings: ChromaSettings = _CHROMA_SETTINGS) -> Any:
+
+    key = (os.path.abspath(persist_directory), _settings_key(settings))
+    with _shared_clients_lock:
+        client = _shared_clients.get(key)
+        if client is None:
+            logger.debug("Opening Chroma PersistentClient at %s", persist_directory)
+            client = chromadb.PersistentClient(path=persist_directory, settings=copy.copy(settings))
+            _shared_clients[key] = client
+        return client
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        "embeddings": _embedding_cache.get_stats(),
+        "results": _result_cache.get_stats(),
+        "candidates": _candidate_cache.get_stats()
+    }
+
+
+def invalidate_retrieval_cache() -> None:
+    _result_cache.clear()
+    _candidate_cache.clear()
+    logger.debug("Retrieval result cache cleared")
+
+
+def clear_retriever_cache() -> None:
+    with _retriever_lock:
+        _retriever_cache.clear()
+    logger.debug("Retriever cache cleared")
+
+_DEFAULT_PERSIST_DIRECTORY = os.environ.get("CHROMA_PERSIST_DIRECTORY")
+_DEFAULT_TEXT_COLLECTION = os.environ.get("TEXT_COLLECTION_NAME")
+_DEFAULT_IMAGE_COLLECTION = os.environ.get("IMAGE_COLLECTION_NAME")
+_DEFAULT_TABLE_COLLECTION = os.environ.get("TABLE_COLLECTION_NAME")
+_DEFAULT_EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL_NAME")
+_DEFAULT_EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "openai")
+_DEFAULT_EMBEDDING_DIMENSIONS = int(os.environ["EMBEDDING_DIMENSIONS"]) if os.environ.get("EMBEDDING_DIMENSIONS") else None
+_DEFAULT_CHROMA_HOST = os.environ.get("CHROMA_HOST")
+_DEFAULT_CHROMA_PORT = int(os.environ.get("CHROMA_PORT", "8000"))
+_DEFAULT_KEYWORD_RERANK = os.environ.get("KEYWORD_RERANK", "true").lower() == "true"
+
+# Chroma only applies hnsw:* settings when a collection is created, so they are
+# sent only for collections that do not exist yet. Changing them (including
+# HNSW_SPACE) requires deleting and re-indexing the collection. Scores from
+# similarity_search_by_vector_with_relevance_scores are raw distances in every
+# space (lower is closer), which is why ranking sorts them ascending.
+COLLECTION_METADATA = {
+    "hnsw:space": os.environ.get("HNSW_SPACE", "l2"),
+    "hnsw:M": int(os.environ.get("HNSW_M", "16")),
+    "hnsw:construction_ef": int(os.environ.get("HNSW_CONSTRUCTION_EF", "64")),
+    "hnsw:search_ef": int(os.environ.get("HNSW_SEARCH_EF", "64"))
+}
+
+
+def collection_metadata_for(client: Any, name: str) -> Optional[Dict[str, Any]]:
+    try:
+        client.get_collection(name=name)
+    except (ValueError, ChromaError):
+        return COLLECTION_METADATA
+    return None
+
+
+@dataclass(frozen=True, slots=True)
 class RetrievalConfig:
     openai_api_key: str
-    chroma_persist_directory: str = os.getenv("CHROMA_PERSIST_DIRECTORY")
-    text_collection_name: str = os.getenv("TEXT_COLLECTION_NAME")
-    image_collection_name: str = os.getenv("IMAGE_COLLECTION_NAME")
-    table_collection_name: str = os.getenv("TABLE_COLLECTION_NAME")
-    embedding_model: str = os.getenv("EMBEDDING_MODEL_NAME")
+    chroma_persist_directory: str = _DEFAULT_PERSIST_DIRECTORY
+    text_collection_name: str = _DEFAULT_TEXT_COLLECTION
+    image_collection_name: str = _DEFAULT_IMAGE_COLLECTION
+    table_collection_name: str = _DEFAULT_TABLE_COLLECTION
+    embedding_model: str = _DEFAULT_EMBEDDING_MODEL
+    embedding_dimensions: Optional[int] = _DEFAULT_EMBEDDING_DIMENSIONS
+    chroma_host: Optional[str] = _DEFAULT_CHROMA_HOST
+    chroma_port: int = _DEFAULT_CHROMA_PORT
+    keyword_rerank: bool = _DEFAULT_KEYWORD_RERANK
+    embedding_backend: str = _DEFAULT_EMBEDDING_BACKEND
+
+
+def _keyword_length_score(keywords: set, doc: Document) -> float:
+    content = doc.page_content.lower()
+    keyword_hits = sum(1 for keyword in keywords if keyword in content)
+    return keyword_hits / (0.1 + len(content) / 1000.0)
+
+
+def _rerank_keyword_length(query: str, docs: List[Document], top_n: int) -> List[Document]:
+    keywords = set(_WORD_PATTERN.findall(query.lower()))
+    if not keywords:
+        return docs[:top_n]
+    return sorted(docs, key=lambda doc: _keyword_length_score(keywords, doc), reverse=True)[:top_n]
+
+
+def _blend_keyword_scores(query: str, candidates: List[list]) -> List[list]:
+    keywords = set(_WORD_PATTERN.findall(query.lower()))
+    if not keywords or not candidates:
+        return candidates
+
+    keyword_scores = [_keyword_length_score(keywords, doc) for doc, _, _ in candidates]
+    top_keyword_score = max(keyword_scores)
+    if top_keyword_score <= 0:
+        return candidates
+
+    return [
+        [doc, rrf_score * (1.0 + _KEYWORD_BLEND * keyword_score / top_keyword_score), type_]
+        for (doc, rrf_score, type_), keyword_score in zip(candidates, keyword_scores)
+    ]
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_filter_items(items: frozenset) -> Dict[str, Any]:
+    clauses = [{key: {"$eq": value}} for key, value in sorted(items)]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _compile_filter(filter_metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not filter_metadata:
+        return None
+    if any(key.startswith("$") or isinstance(value, dict) for key, value in filter_metadata.items()):
+        return filter_metadata
+    try:
+        return _compile_filter_items(frozenset(filter_metadata.items()))
+    except TypeError:
+        return filter_metadata
+
+
+def _mmr_select(query_vector: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+
+    sim_query = candidates @ query_vector
+    sim_candidates = candidates @ candidates.T
+
+    selected = [int(np.argmax(sim_query))]
+    max_redundancy = sim_candidates[selected[0]].copy()
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * sim_query - (1 - lambda_mult) * max_redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(max_redundancy, sim_candidates[best], out=max_redundancy)
+    return selected
+
+
+def _doc_id(doc: Document) -> str:
+    metadata = doc.metadata
+    return (
+        getattr(doc, "id", None)
+        or metadata.get("chunk_id")
+        or metadata.get("image_id")
+        or metadata.get("table_id")
+        or doc.page_content
+    )
 
 
 class MultimodalRetriever:
@@ -25,228 +276,429 @@ class MultimodalRetriever:
 
         logger.info("Initializing Multimodal Retriever...")
         
-        self.embeddings = OpenAIEmbeddings(
-            model=config.embedding_model,
-            openai_api_key=config.openai_api_key
-        )
+        if config.embedding_backend == "fastembed":
+            self.embeddings = get_fastembed_backend(config.embedding_model)
+        else:
+            self.embeddings = OpenAIEmbeddings(
+                model=config.embedding_model,
+                dimensions=config.embedding_dimensions,
+                openai_api_key=config.openai_api_key,
+                max_retries=2,
+                request_timeout=15.0,
+                http_client=httpx.Client(limits=_EMBEDDING_HTTP_LIMITS),
+                http_async_client=httpx.AsyncClient(limits=_EMBEDDING_HTTP_LIMITS)
+            )
         
+        if config.chroma_host:
+            logger.info("Connecting to Chroma server at %s:%s", config.chroma_host, config.chroma_port)
+            client = chromadb.HttpClient(host=config.chroma_host, port=config.chroma_port, settings=copy.copy(_CHROMA_SETTINGS))
+        else:
+            client = get_persistent_client(config.chroma_persist_directory)
+
         self.text_store = Chroma(
             collection_name=config.text_collection_name,
             embedding_function=self.embeddings,
-            persist_directory=config.chroma_persist_directory
+            collection_metadata=collection_metadata_for(client, config.text_collection_name),
+            client=client
         )
         
         self.image_store = Chroma(
             collection_name=config.image_collection_name,
             embedding_function=self.embeddings,
-            persist_directory=config.chroma_persist_directory
+            collection_metadata=collection_metadata_for(client, config.image_collection_name),
+            client=client
         )
         
         self.table_store = Chroma(
             collection_name=config.table_collection_name,
             embedding_function=self.embeddings,
-            persist_directory=config.chroma_persist_directory
+            collection_metadata=collection_metadata_for(client, config.table_collection_name),
+            client=client
         )
 
-        logger.info(f"Retriever initialized from: {config.chroma_persist_directory}")
-        logger.debug(f"Embedding model: {config.embedding_model}")
-
-    def retrieve_all(self, query: str, k_text: int = 5, k_images: int = 3, k_tables: int = 3, filter_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, List[Document]]:
-        
-        logger.info("Retrieving from ALL sources...")
-        logger.info(f"Query: '{query}'")
-        logger.debug(f"Parameters: k_text={k_text}, k_images={k_images}, k_tables={k_tables}")
+        self._store_key = (
+            config.chroma_host or config.chroma_persist_directory,
+            config.text_collection_name,
+            config.image_collection_name,
+            config.table_collection_name,
+            config.embedding_backend,
+            config.embedding_model,
+            config.embedding_dimensions
+        )
 
-        results = {
-            "text": [],
-            "images": [],
-            "tables": []
+        self._store_by_type = {
+            "text": self.text_store,
+            "image": self.image_store,
+            "table": self.table_store
         }
-        
+
+        self._pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="retrieval")
+
+        logger.info("Retriever initialized from: %s", config.chroma_persist_directory)
+        logger.debug("Embedding model: %s", config.embedding_model)
+
+
+    def _embedding_cache_key(self, query: str) -> tuple:
+        return (self.config.embedding_backend, self.config.embedding_model, self.config.embedding_dimensions, query)
+
+
+    def prime_query_embeddings(self, queries: List[str]) -> int:
+
+        pending = list(dict.fromkeys(
+            query for query in queries
+            if not _embedding_cache.contains(self._embedding_cache_key(query))
+        ))
+        if not pending:
+            return 0
+
+        embed_queries = getattr(self.embeddings, "embed_queries", self.embeddings.embed_documents)
         try:
-            if filter_metadata:
-                logger.debug(f"Applying metadata filter: {filter_metadata}")
-                results["text"] = self.text_store.similarity_search(
-                    query, k=k_text, filter=filter_metadata
-                )
-            else:
-                results["text"] = self.text_store.similarity_search(query, k=k_text)
-            logger.info(f"Found {len(results['text'])} text chunks")
+            vectors = embed_queries(pending)
         except Exception as e:
-            logger.error(f"Text retrieval failed: {str(e)}", exc_info=True)
-        
+            logger.error("Batch query embedding failed: %s", e, exc_info=True)
+            return 0
+
+        for query, vector in zip(pending, vectors):
+            _embedding_cache.put(self._embedding_cache_key(query), vector)
+
+        logger.debug("Embedded %s queries in one request", len(pending))
+        return len(pending)
+
+
+    def _embed_query(self, query: str) -> Optional[List[float]]:
+
+        cache_key = self._embedding_cache_key(query)
+        query_vector = _embedding_cache.get(cache_key)
+        if query_vector is not None:
+            logger.debug("Query embedding cache hit")
+            return query_vector
+
         try:
-            if filter_metadata:
-                results["images"] = self.image_store.similarity_search(
-                    query, k=k_images, filter=filter_metadata
-                )
-            else:
-                results["images"] = self.image_store.similarity_search(query, k=k_images)
-            logger.info(f"Found {len(results['images'])} images")
+            query_vector = self.embeddings.embed_query(query)
         except Exception as e:
-            logger.error(f"Image retrieval failed: {str(e)}", exc_info=True)
+            logger.error("Query embedding failed: %s", e, exc_info=True)
+            _record_search_failure()
+            return None
+
+        _embedding_cache.put(cache_key, query_vector)
+        return query_vector
+
+
+    def retrieve_all(self, query: str, k_text: int = 5, k_images: int = 3, k_tables: int = 3, filter_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, List[Document]]:
         
-        try:
-            if filter_metadata:
-                results["tables"] = self.table_store.similarity_search(
-                    query, k=k_tables, filter=filter_metadata
-                )
+        logger.debug("Retrieving from ALL sources...")
+        logger.debug("Query: '%s'", query)
+        logger.debug("Parameters: k_text=%s, k_images=%s, k_tables=%s", k_text, k_images, k_tables)
+
+        compiled_filter = _compile_filter(filter_metadata)
+        search_kwargs = {"filter": compiled_filter} if compiled_filter else {}
+        if compiled_filter:
+            logger.debug("Applying metadata filter: %s", compiled_filter)
+
+        fetch = _RERANK_FETCH_MULTIPLIER if self.config.keyword_rerank else 1
+        prefetch = max(k_text * fetch, k_images * fetch, k_tables * fetch, _DEFAULT_PREFETCH)
+
+        cache_key = (self._store_key, query, prefetch, json.dumps(compiled_filter, sort_keys=True, default=str))
+        candidates = _candidate_cache.get(cache_key)
+        if candidates is None:
+            failures = _search_failure_count()
+            query_vector = self._embed_query(query)
+            if query_vector is None:
+                return self._collect({}, "results")
+
+            jobs = {
+                "text": self._submit("text", self.text_store.similarity_search_by_vector, query_vector, k=prefetch, **search_kwargs),
+                "images": self._submit("images", self.image_store.similarity_search_by_vector, query_vector, k=prefetch, **search_kwargs),
+                "tables": self._submit("tables", self.table_store.similarity_search_by_vector, query_vector, k=prefetch, **search_kwargs)
+            }
+            candidates = self._collect(jobs, "candidates")
+            if _search_failure_count() == failures:
+                _candidate_cache.put(cache_key, candidates)
             else:
-                results["tables"] = self.table_store.similarity_search(query, k=k_tables)
-            logger.info(f"Found {len(results['tables'])} tables")
+                logger.warning("Not caching candidates for '%s': a store search failed", query)
+        else:
+            logger.debug("Candidate cache hit (prefetch=%s)", prefetch)
+
+        results = {}
+        for key, top_n in (("text", k_text), ("images", k_images), ("tables", k_tables)):
+            if self.config.keyword_rerank:
+                results[key] = _rerank_keyword_length(query, candidates[key][:top_n * fetch], top_n)
+            else:
+                results[key] = candidates[key][:top_n]
+
+        return copy.deepcopy(results)
+
+
+    def _mmr_search(self, store: Chroma, query_vector: List[float], k: int, fetch_k: int, lambda_mult: float) -> List[Document]:
+
+        response = store._collection.query(
+            query_embeddings=[query_vector],
+            n_results=fetch_k,
+            include=["embeddings", "documents", "metadatas"]
+        )
+        embeddings = response["embeddings"][0] if response.get("embeddings") is not None else []
+        if len(embeddings) == 0:
+            return []
+
+        selected = _mmr_select(
+            np.asarray(query_vector, dtype=np.float32),
+            np.asarray(embeddings, dtype=np.float32),
+            k,
+            lambda_mult
+        )
+
+        ids = response["ids"][0]
+        documents = response["documents"][0]
+        metadatas = response["metadatas"][0]
+        return [
+            Document(id=ids[i], page_content=documents[i], metadata=metadatas[i] or {})
+            for i in selected
+        ]
+
+
+    def _safe_search(self, label: str, search: Callable[..., list], *args, **kwargs) -> Optional[list]:
+
+        try:
+            return search(*args, **kwargs)
         except Exception as e:
-            logger.error(f"Table retrieval failed: {str(e)}", exc_info=True)
+            logger.error("%s retrieval failed: %s", label, e, exc_info=True)
+            return None
 
-        return results
 
+    def _submit(self, key: str, search: Callable[..., list], *args, **kwargs) -> Future:
+        return self._pool.submit(self._safe_search, _STORE_LABELS[key], search, *args, **kwargs)
 
-    def retrieve_with_scores(self,query: str,k_text: int = 5,k_images: int = 3,k_tables: int = 3) -> Dict[str, List[tuple[Document, float]]]:
-        
-        logger.info("Retrieving with similarity scores...")
-        logger.debug(f"Query: '{query}'")
+
+    def _collect(self, jobs: Dict[str, Future], label: str) -> Dict[str, list]:
 
         results = {
             "text": [],
             "images": [],
             "tables": []
         }
-        
-        try:
-            results["text"] = self.text_store.similarity_search_with_score(query, k=k_text)
-            logger.info(f"Text: {len(results['text'])} results with scores")
-        except Exception as e:
-            logger.error(f"Text retrieval failed: {str(e)}", exc_info=True)
-        
-        try:
-            results["images"] = self.image_store.similarity_search_with_score(query, k=k_images)
-            logger.info(f"Images: {len(results['images'])} results with scores")
-        except Exception as e:
-            logger.error(f"Image retrieval failed: {str(e)}", exc_info=True)
-        
-        try:
-            results["tables"] = self.table_store.similarity_search_with_score(query, k=k_tables)
-            logger.info(f"Tables: {len(results['tables'])} results with scores")
-        except Exception as e:
-            logger.error(f"Table retrieval failed: {str(e)}", exc_info=True)
+
+        for key, future in jobs.items():
+            found = future.result()
+            if found is None:
+                _record_search_failure()
+                found = []
+            results[key] = found
+            logger.debug("%s: %s %s", _STORE_LABELS[key], len(results[key]), label)
 
         return results
 
-    def retrieve_hybrid_ranked(self,query: str,k: int = 10,text_weight: float = 0.5,image_weight: float = 0.25,table_weight: float = 0.25) -> List[tuple[Document, float, str]]: 
-        
-        logger.info("Hybrid retrieval with weighted ranking...")
-        logger.debug(f"Weights: text={text_weight}, image={image_weight}, table={table_weight}")
 
-        all_results = []
-        
-        try:
-            text_results = self.text_store.similarity_search_with_score(query, k=k)
-            for doc, score in text_results:
-                weighted_score = score * text_weight
-                all_results.append((doc, weighted_score, "text"))
-            logger.debug(f"Added {len(text_results)} text results")
-        except Exception as e:
-            logger.error(f"Text retrieval failed: {str(e)}", exc_info=True)
+    def retrieve_with_scores(self,query: str,k_text: int = 5,k_images: int = 3,k_tables: int = 3) -> Dict[str, List[tuple[Document, float]]]:
         
-        try:
-            image_results = self.image_store.similarity_search_with_score(query, k=k)
-            for doc, score in image_results:
-                weighted_score = score * image_weight
-                all_results.append((doc, weighted_score, "image"))
-            logger.debug(f"Added {len(image_results)} image results")
-        except Exception as e:
-            logger.error(f"Image retrieval failed: {str(e)}", exc_info=True)
+        logger.debug("Retrieving with similarity scores...")
+        logger.debug("Query: '%s'", query)
+
+        query_vector = self._embed_query(query)
+        if query_vector is None:
+            return self._collect({}, "results with scores")
+
+        jobs = {
+            "text": self._submit("text", self.text_store.similarity_search_by_vector_with_relevance_scores, query_vector, k=k_text),
+            "images": self._submit("images", self.image_store.similarity_search_by_vector_with_relevance_scores, query_vector, k=k_images),
+            "tables": self._submit("tables", self.table_store.similarity_search_by_vector_with_relevance_scores, query_vector, k=k_tables)
+        }
+
+        return self._collect(jobs, "results with scores")
+
+    def retrieve_hybrid_ranked(self,query: str,k: int = 10,text_weight: float = 0.5,image_weight: float = 0.25,table_weight: float = 0.25) -> List[tuple[Document, float, str]]: 
         
-        try:
-            table_results = self.table_store.similarity_search_with_score(query, k=k)
-            for doc, score in table_results:
-                weighted_score = score * table_weight
-                all_results.append((doc, weighted_score, "table"))
-            logger.debug(f"Added {len(table_results)} table results")
-        except Exception as e:
-            logger.error(f"Table retrieval failed: {str(e)}", exc_info=True)
+        logger.debug("Hybrid retrieval with weighted reciprocal rank fusion...")
+        logger.debug("Weights: text=%s, image=%s, table=%s", text_weight, image_weight, table_weight)
+
+        query_vector = self._embed_query(query)
+        if query_vector is None:
+            return []
+
+        fetch_k = k * _RERANK_FETCH_MULTIPLIER if self.config.keyword_rerank else k
+
+        jobs = {
+            "text": self._submit("text", self.text_store.similarity_search_by_vector_with_relevance_scores, query_vector, k=fetch_k),
+            "images": self._submit("images", self.image_store.similarity_search_by_vector_with_relevance_scores, query_vector, k=fetch_k),
+            "tables": self._submit("tables", self.table_store.similarity_search_by_vector_with_relevance_scores, query_vector, k=fetch_k)
+        }
+        scored = self._collect(jobs, "scored candidates")
+
+        weights = {
+            "text": ("text", text_weight),
+            "images": ("image", image_weight),
+            "tables": ("table", table_weight)
+        }
+        fused = {}
+        for key, (type_, weight) in weights.items():
+            ranked = sorted(scored[key], key=itemgetter(1))
+            for rank, (doc, _) in enumerate(ranked, 1):
+                doc_key = (type_, _doc_id(doc))
+                rrf_score = weight / (_RRF_K + rank)
+                if doc_key in fused:
+                    fused[doc_key][1] += rrf_score
+                else:
+                    fused[doc_key] = [doc, rrf_score, type_]
+
+        candidates = heapq.nlargest(fetch_k, fused.values(), key=itemgetter(1))
+
+        if self.config.keyword_rerank:
+            candidates = _blend_keyword_scores(query, candidates)
 
-        all_results.sort(key=lambda x: x[1])
-        top_results = all_results[:k]
+        top_results = [tuple(item) for item in heapq.nlargest(k, candidates, key=itemgetter(1))]
 
-        logger.info(f"Returned top {len(top_results)} ranked results")
+        logger.debug("Returned top %s ranked results", len(top_results))
         for i, (doc, score, type_) in enumerate(top_results[:5], 1):
-            logger.debug(f"  {i}. [{type_.upper()}] score={score:.4f}")
+            logger.debug("  %s. [%s] score=%.4f", i, type_.upper(), score)
 
         return top_results
 
 
     def retrieve_mmr(self,query: str,k: int = 10,fetch_k: int = 30,lambda_mult: float = 0.5,include_text: bool = True,include_images: bool = True,include_tables: bool = True) -> Dict[str, List[Document]]:
         
-        logger.info("MMR retrieval (diversity-focused)...")
-        logger.debug(f"Parameters: k={k}, fetch_k={fetch_k}, lambda={lambda_mult}")
-        logger.debug(f"Include: text={include_text}, images={include_images}, tables={include_tables}")
+        logger.debug("MMR retrieval (diversity-focused)...")
+        logger.debug("Parameters: k=%s, fetch_k=%s, lambda=%s", k, fetch_k, lambda_mult)
+        logger.debug("Include: text=%s, images=%s, tables=%s", include_text, include_images, include_tables)
+
+        stores = {
+            "text": (include_text, self.text_store),
+            "images": (include_images, self.image_store),
+            "tables": (include_tables, self.table_store)
+        }
+        if not any(include for include, _ in stores.values()):
+            return self._collect({}, "diverse results")
 
-        results = {
-            "text": [],
-            "images": [],
-            "tables": []
+        query_vector = self._embed_query(query)
+        if query_vector is None:
+            return self._collect({}, "diverse results")
+
+        jobs = {
+            key: self._submit(key, self._mmr_search, store, query_vector, k, fetch_k, lambda_mult)
+            for key, (include, store) in stores.items()
+            if include
         }
-        
-        if include_text:
-            try:
-                results["text"] = self.text_store.max_marginal_relevance_search(
-                    query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
-                )
-                logger.info(f"Text: {len(results['text'])} diverse results")
-            except Exception as e:
-                logger.error(f"Text MMR failed: {str(e)}", exc_info=True)
-        
-        if include_images:
-            try:
-                results["images"] = self.image_store.max_marginal_relevance_search(
-                    query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
-                )
-                logger.info(f"Images: {len(results['images'])} diverse results")
-            except Exception as e:
-                logger.error(f"Image MMR failed: {str(e)}", exc_info=True)
-        
-        if include_tables:
-            try:
-                results["tables"] = self.table_store.max_marginal_relevance_search(
-                    query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
-                )
-                logger.info(f"Tables: {len(results['tables'])} diverse results")
-            except Exception as e:
-                logger.error(f"Table MMR failed: {str(e)}", exc_info=True)
 
-        return results
+        return self._collect(jobs, "diverse results")
 
 
     def retrieve_by_type_only(self,query: str,type_: Literal["text", "image", "table"],k: int = 5) -> List[Document]:
         
-        logger.info(f"Retrieving {type_} only...")
-        logger.debug(f"Query: '{query}', k={k}")
-
-        if type_ == "text":
-            results = self.text_store.similarity_search(query, k=k)
-        elif type_ == "image":
-            results = self.image_store.similarity_search(query, k=k)
-        elif type_ == "table":
-            results = self.table_store.similarity_search(query, k=k)
-        else:
-            logger.error(f"Invalid type: {type_}")
+        logger.debug("Retrieving %s only...", type_)
+        logger.debug("Query: '%s', k=%s", query, k)
+
+        store = self._store_by_type.get(type_)
+        if store is None:
+            logger.error("Invalid type: %s", type_)
             raise ValueError(f"Invalid type: {type_}. Must be 'text', 'image', or 'table'")
 
-        logger.info(f"Found {len(results)} {type_} results")
+        results = store.similarity_search(query, k=k)
+
+        logger.debug("Found %s %s results", len(results), type_)
         return results
 
 
+def _total(results: Dict[str, List[Document]]) -> int:
+    return len(results["text"]) + len(results["images"]) + len(results["tables"])
+
+
+def _do_all(retriever: MultimodalRetriever, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    results = retriever.retrieve_all(query, **params)
+    return {"results": results, "total_results": _total(results)}
+
+
+def _do_hybrid(retriever: MultimodalRetriever, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    ranked_results = retriever.retrieve_hybrid_ranked(query, **params)
+
+    results = {"text": [], "images": [], "tables": []}
+    for doc, score, type_ in ranked_results:
+        results[_TYPE_TO_KEY[type_]].append(doc)
+
+    return {"results": results, "ranked_results": ranked_results, "total_results": len(ranked_results)}
+
+
+def _do_mmr(retriever: MultimodalRetriever, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    results = retriever.retrieve_mmr(query, **params)
+    return {"results": results, "total_results": _total(results)}
+
+
+def _type_only(type_: Literal["text", "image", "table"]) -> Callable[[MultimodalRetriever, str, Dict[str, Any]], Dict[str, Any]]:
+
+    def _do_type_only(retriever: MultimodalRetriever, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        docs = retriever.retrieve_by_type_only(query, type_, **params)
+        results = {"text": [], "images": [], "tables": []}
+        results[_TYPE_TO_KEY[type_]] = docs
+        return {"results": results, "total_results": len(docs)}
+
+    return _do_type_only
+
+
+_SAME_K = lambda k: k
+_HALF_K = lambda k: max(2, k // 2)
+
+_METHODS = {
+    "all": (_do_all, {"k_text": _SAME_K, "k_images": _HALF_K, "k_tables": _HALF_K, "filter_metadata": None}),
+    "hybrid": (_do_hybrid, {"k": _SAME_K, "text_weight": 0.5, "image_weight": 0.25, "table_weight": 0.25}),
+    "mmr": (_do_mmr, {"k": _SAME_K, "fetch_k": lambda k: k * 3, "lambda_mult": 0.5, "include_text": True, "include_images": True, "include_tables": True}),
+    "text_only": (_type_only("text"), {"k": _SAME_K}),
+    "image_only": (_type_only("image"), {"k": _SAME_K}),
+    "table_only": (_type_only("table"), {"k": _SAME_K})
+}
+
+
+@functools.lru_cache(maxsize=64)
+def _make_plan(method: str, k: int, kw_items: Tuple[Tuple[str, Any], ...]) -> Tuple[Callable[[MultimodalRetriever, str, Dict[str, Any]], Dict[str, Any]], Dict[str, Any]]:
+    handler, defaults = _METHODS[method]
+    overrides = dict(kw_items)
+    params = {
+        name: overrides[name] if name in overrides else (default(k) if callable(default) else default)
+        for name, default in defaults.items()
+    }
+    return handler, params
+
+
+def get_retriever(config: RetrievalConfig) -> MultimodalRetriever:
+
+    key = (
+        config.openai_api_key,
+        config.chroma_persist_directory,
+        config.chroma_host,
+        config.chroma_port,
+        config.text_collection_name,
+        config.image_collection_name,
+        config.table_collection_name,
+        config.embedding_model,
+        config.embedding_dimensions,
+        config.embedding_backend
+    )
+
+    retriever = _retriever_cache.get(key)
+    if retriever is None:
+        with _retriever_lock:
+            retriever = _retriever_cache.get(key)
+            if retriever is None:
+                retriever = MultimodalRetriever(config)
+                _retriever_cache[key] = retriever
+    return retriever
+
+
 def retrieve_multimodal(query: str,config: RetrievalConfig,method: Literal["all", "hybrid", "mmr", "text_only", "image_only", "table_only"] = "all",k: int = 5,**kwargs) -> Dict[str, Any]:
    
     start_time = time.time()
     
-    logger.info("="*80)
-    logger.info(f"Starting multimodal retrieval")
-    logger.info(f"Query: '{query}'")
-    logger.info(f"Method: {method}, k: {k}")
-    logger.info("="*80)
+    logger.debug("Starting multimodal retrieval: query='%s', method=%s, k=%s", query, method, k)
+
+    cache_key = (
+        astuple(config),
+        query,
+        method,
+        k,
+        json.dumps(kwargs, sort_keys=True, default=str)
+    )
+    cached = _result_cache.get(cache_key)
+    if cached is not None:
+        logger.debug("Retrieval cache hit (%s results)", cached['total_results'])
+        return copy.deepcopy(cached)
     
-    retriever = MultimodalRetriever(config)
+    retriever = get_retriever(config)
     
     result = {
         "query": query,
@@ -254,144 +706,109 @@ def retrieve_multimodal(query: str,config: RetrievalConfig,method: Literal["all"
         "results": None
     }
 
-    if method == "all":
-        results = retriever.retrieve_all(
-            query,
-            k_text=kwargs.get("k_text", k),
-            k_images=kwargs.get("k_images", max(2, k // 2)),
-            k_tables=kwargs.get("k_tables", max(2, k // 2)),
-            filter_metadata=kwargs.get("filter_metadata")
-        )
-        result["results"] = results
-        result["total_results"] = (len(results["text"]) + len(results["images"]) + len(results["tables"]))
-
-    elif method == "hybrid":
-        ranked_results = retriever.retrieve_hybrid_ranked(
-            query,
-            k=k,
-            text_weight=kwargs.get("text_weight", 0.5),
-            image_weight=kwargs.get("image_weight", 0.25),
-            table_weight=kwargs.get("table_weight", 0.25)
-        )
-
-        results = {"text": [], "images": [], "tables": []}
-        for doc, score, type_ in ranked_results:
-            if type_ == "text":
-                results["text"].append(doc)
-            elif type_ == "image":
-                results["images"].append(doc)
-            elif type_ == "table":
-                results["tables"].append(doc)
-
-        result["results"] = results
-        result["ranked_results"] = ranked_results  
-        result["total_results"] = len(ranked_results)
-
-    elif method == "mmr":
-        results = retriever.retrieve_mmr(
-            query,
-            k=k,
-            fetch_k=kwargs.get("fetch_k", k * 3),
-            lambda_mult=kwargs.get("lambda_mult", 0.5),
-            include_text=kwargs.get("include_text", True),
-            include_images=kwargs.get("include_images", True),
-            include_tables=kwargs.get("include_tables", True)
-        )
-        result["results"] = results
-        result["total_results"] = (
-            len(results["text"]) +
-            len(results["images"]) +
-            len(results["tables"])
-        )
-        
-    elif method == "text_only":
-        docs = retriever.retrieve_by_type_only(query, "text", k=k)
-        result["results"] = {"text": docs, "images": [], "tables": []}
-        result["total_results"] = len(docs)
-
-    elif method == "image_only":
-        docs = retriever.retrieve_by_type_only(query, "image", k=k)
-        result["results"] = {"text": [], "images": docs, "tables": []}
-        result["total_results"] = len(docs)
-
-    elif method == "table_only":
-        docs = retriever.retrieve_by_type_only(query, "table", k=k)
-        result["results"] = {"text": [], "images": [], "tables": docs}
-        result["total_results"] = len(docs)
-    else:
-        logger.error(f"Unknown retrieval method: {method}")
+    if method not in _METHODS:
+        logger.error("Unknown retrieval method: %s", method)
         raise ValueError(f"Unknown method: {method}")
 
+    kw_items = tuple(sorted(kwargs.items()))
+    try:
+        handler, params = _make_plan(method, k, kw_items)
+    except TypeError:
+        handler, params = _make_plan.__wrapped__(method, k, kw_items)
+
+    failures = _search_failure_count()
+    result.update(handler(retriever, query, params))
+    result["degraded"] = _search_failure_count() != failures
+
     duration = time.time() - start_time
     
-    logger.info("="*80)
-    logger.info("Retrieval Summary:")
-    logger.info(f"  Method: {method}")
-    logger.info(f"  Total results: {result['total_results']}")
-    if result.get("results"):
-        logger.info(f"  Text: {len(result['results'].get('text', []))}")
-        logger.info(f"  Images: {len(result['results'].get('images', []))}")
-        logger.info(f"  Tables: {len(result['results'].get('tables', []))}")
-    logger.info(f"  Retrieval time: {duration:.2f}s")
-    logger.info("="*80)
-
+    retrieved = result.get("results") or {}
+    logger.info(
+        "Retrieval %s: %d results (text=%d, images=%d, tables=%d) in %.2fs",
+        method,
+        result["total_results"],
+        len(retrieved.get("text", [])),
+        len(retrieved.get("images", [])),
+        len(retrieved.get("tables", [])),
+        duration
+    )
+
+    if result["degraded"]:
+        logger.warning("Not caching degraded %s retrieval for '%s'", method, query)
+    else:
+        _result_cache.put(cache_key, copy.deepcopy(result))
     return result
 
 
+def _pdf_source_line(metadata: Dict[str, Any]) -> str:
+    pdf_url = metadata.get("source_pdf_url") or metadata.get("pdf_url", "")
+    return f"\n   Source: {pdf_url[:80]}..." if pdf_url else ""
+
+
+def _format_text_result(i: int, doc: Document) -> str:
+    metadata = doc.metadata
+    page = f"\n   Page: {metadata['chunk_page_number']}" if "chunk_page_number" in metadata else ""
+    return f"\n{i}. {doc.page_content[:100]}{_pdf_source_line(metadata)}{page}"
+
+
+def _format_image_result(i: int, doc: Document) -> str:
+    metadata = doc.metadata
+    image_url = f"\n   Image URL: {metadata['supabase_url'][:80]}..." if "supabase_url" in metadata else ""
+    ai_flag = "\n   [AI-generated description]" if metadata.get("ai_generated_description") else ""
+    return f"\n{i}. {doc.page_content[:100]}...{image_url}{_pdf_source_line(metadata)}{ai_flag}"
+
+
+def _format_table_result(i: int, doc: Document) -> str:
+    metadata = doc.metadata
+    page = f"\n   Page: {metadata['table_page_number']}" if "table_page_number" in metadata else ""
+    return f"\n{i}. {doc.page_content[:100]}{_pdf_source_line(metadata)}{page}"
+
+
+def retrieve_multimodal_batch(queries: List[str],config: RetrievalConfig,method: Literal["all", "hybrid", "mmr", "text_only", "image_only", "table_only"] = "all",k: int = 5,**kwargs) -> List[Dict[str, Any]]:
+
+    if not queries:
+        return []
+
+    start_time = time.time()
+
+    retriever = get_retriever(config)
+    retriever.prime_query_embeddings(queries)
+
+    with ThreadPoolExecutor(max_workers=min(8, len(queries)), thread_name_prefix="retrieval-batch") as executor:
+        results = list(executor.map(
+            lambda query: retrieve_multimodal(query, config, method=method, k=k, **kwargs),
+            queries
+        ))
+
+    logger.info("Batch retrieval %s: %d queries in %.2fs", method, len(queries), time.time() - start_time)
+    return results
+
+
 def format_result_with_sources(result: Dict[str, Any]) -> str:
     
     logger.debug("Formatting retrieval results with sources...")
     
-    output = []
-    output.append(f"\n{'='*60}")
-    output.append(f"QUERY: {result['query']}")
-    output.append(f"METHOD: {result['method']}")
-    output.append(f"TOTAL RESULTS: {result['total_results']}")
-    output.append(f"{'='*60}\n")
+    output = [
+        f"\n{'='*60}",
+        f"QUERY: {result['query']}",
+        f"METHOD: {result['method']}",
+        f"TOTAL RESULTS: {result['total_results']}",
+        f"{'='*60}\n"
+    ]
     
     results = result.get("results", {})
     
     if results.get("text"):
         output.append(f"TEXT CHUNKS ({len(results['text'])}):")
-        for i, doc in enumerate(results["text"], 1):
-            content_preview = doc.page_content[:100] if len(doc.page_content) > 100 else doc.page_content
-            output.append(f"\n{i}. {content_preview}")
-            
-            if "source_pdf_url" in doc.metadata or "pdf_url" in doc.metadata:
-                pdf_url = doc.metadata.get("source_pdf_url") or doc.metadata.get("pdf_url", "")
-                if pdf_url:
-                    output.append(f"   Source: {pdf_url[:80]}...")
-            if "chunk_page_number" in doc.metadata:
-                output.append(f"   Page: {doc.metadata['chunk_page_number']}")
+        output.extend(_format_text_result(i, doc) for i, doc in enumerate(results["text"], 1))
     
     if results.get("images"):
         output.append(f"\nIMAGES ({len(results['images'])}):")
-        for i, doc in enumerate(results["images"], 1):
-            output.append(f"\n{i}. {doc.page_content[:100]}...")
-            
-            if "supabase_url" in doc.metadata:
-                output.append(f"   Image URL: {doc.metadata['supabase_url'][:80]}...")
-            if "source_pdf_url" in doc.metadata or "pdf_url" in doc.metadata:
-                pdf_url = doc.metadata.get("source_pdf_url") or doc.metadata.get("pdf_url", "")
-                if pdf_url:
-                    output.append(f"   Source: {pdf_url[:80]}...")
-            
-            if doc.metadata.get("ai_generated_description"):
-                output.append(f"   [AI-generated description]")
+        output.extend(_format_image_result(i, doc) for i, doc in enumerate(results["images"], 1))
     
     if results.get("tables"):
         output.append(f"\nTABLES ({len(results['tables'])}):")
-        for i, doc in enumerate(results["tables"], 1):
-            content_preview = doc.page_content[:100] if len(doc.page_content) > 100 else doc.page_content
-            output.append(f"\n{i}. {content_preview}")
-            
-            if "source_pdf_url" in doc.metadata or "pdf_url" in doc.metadata:
-                pdf_url = doc.metadata.get("source_pdf_url") or doc.metadata.get("pdf_url", "")
-                if pdf_url:
-                    output.append(f"   Source: {pdf_url[:80]}...")
-            
-            if "table_page_number" in doc.metadata:
-                output.append(f"   Page: {doc.metadata['table_page_number']}")
+        output.extend(_format_table_result(i, doc) for i, doc in enumerate(results["tables"], 1))
     
     logger.debug("Result formatting completed")
     return "\n".join(output)
@@ -401,28 +818,23 @@ def get_unique_source_pdfs(result: Dict[str, Any]) -> List[Dict[str, str]]:
     
     logger.debug("Extracting unique source PDFs...")
     
-    pdfs = {}
-    results = result.get("results", {})
-    
-    for type_key in ["text", "images", "tables"]:
-        if results.get(type_key):
-            for doc in results[type_key]:
-                pdf_url = (
-                    doc.metadata.get("source_pdf_url") or 
-                    doc.metadata.get("pdf_url")
-                )
-                pdf_path = (
-                    doc.metadata.get("source_pdf_path") or 
-                    doc.metadata.get("pdf_storage_path")
-                )
-                
-                if pdf_url and pdf_url not in pdfs:
-                    pdfs[pdf_url] = {
-                        "url": pdf_url,
-                        "storage_path": pdf_path or "",
-                        "filename": doc.metadata.get("pdf_original_filename", ""),
-                        "bucket": doc.metadata.get("document_bucket", "")
-                    }
+    results = result.get("results") or {}
+    seen = set()
+    pdfs = []
+
+    for doc in chain.from_iterable(results.get(type_key) or () for type_key in ("text", "images", "tables")):
+        metadata = doc.metadata
+        pdf_url = metadata.get("source_pdf_url") or metadata.get("pdf_url")
+        if not pdf_url or pdf_url in seen:
+            continue
+
+        seen.add(pdf_url)
+        pdfs.append({
+            "url": pdf_url,
+            "storage_path": metadata.get("source_pdf_path") or metadata.get("pdf_storage_path") or "",
+            "filename": metadata.get("pdf_original_filename", ""),
+            "bucket": metadata.get("document_bucket", "")
+        })
     
-    logger.debug(f"Found {len(pdfs)} unique source PDFs")
-    return list(pdfs.values())
\ No newline at end of file
+    logger.debug("Found %s unique source PDFs", len(pdfs))
+    return pdfs
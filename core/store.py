@@ -1,15 +1,136 @@
 import os
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import uuid
+import sqlite3
+import hashlib
+import threading
+import asyncio
+import logging
+import functools
+import orjson
+import blake3
+import openai
+import httpx
+import tiktoken
+from operator import attrgetter
+from itertools import accumulate, islice
+from contextlib import closing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type, before_sleep_log
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, astuple, replace
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
-from langchain_core.documents import Document
+from core.retrieval import collection_metadata_for, invalidate_retrieval_cache, get_persistent_client
+from core.embeddings import get_fastembed_backend
+from core._async_utils import run_sync
 from config.logger_config import get_logger
 import time
 
 logger = get_logger(__name__)
 
-@dataclass
+_EMBED_MAX_TOKENS = 250_000
+_EMBED_MAX_ITEMS = 500
+_EMBED_MAX_INPUT_TOKENS = 8191
+_EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "5"))
+_EMBED_MAX_RETRY_WAIT = 30
+
+_DEDUP_DB_NAME = "content_hashes.sqlite3"
+_ELEMENT_ID_KEYS = {"text": "chunk_id", "image": "image_id", "table": "table_id"}
+_SQLITE_MAX_PARAMS = 900
+_STORE_CACHE_SIZE = 8
+
+_STORE_WINDOW = _EMBED_MAX_ITEMS * _EMBED_MAX_IN_FLIGHT
+_FLAG_KEYS = {"image": "ai_generated_description", "table": "has_html"}
+
+_SOURCE_PDF_KEYS = ("source_pdf_url", "source_pdf_path")
+_SCALAR_TYPES = frozenset((str, int, float, bool))
+_CONTAINER_TYPES = frozenset((list, dict))
+
+_TRANSIENT_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError, httpx.TransportError)
+
+_backoff_with_jitter = wait_random_exponential(multiplier=1, max=_EMBED_MAX_RETRY_WAIT)
+
+
+@functools.lru_cache(maxsize=4)
+def _get_encoding(model: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        logger.debug("No tiktoken encoding registered for %s, using cl100k_base", model)
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _unzip_records(records: Iterable[Tuple[str, Dict[str, Any]]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    texts = []
+    metadatas = []
+    for text, metadata in records:
+        texts.append(text)
+        metadatas.append(metadata)
+    return texts, metadatas
+
+
+def _windows(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(iterable)
+    while window := list(islice(iterator, size)):
+        yield window
+
+
+def _count_flagged(doc_type: str, metadatas: List[Dict[str, Any]]) -> int:
+    flag_key = _FLAG_KEYS.get(doc_type)
+    return sum(1 for metadata in metadatas if metadata.get(flag_key)) if flag_key else 0
+
+
+def _content_hash(collection_name: str, metadata: Dict[str, Any], element_id: str, content: str) -> str:
+    hasher = blake3.blake3()
+    for part in (collection_name, metadata.get("source_file", ""), metadata.get("source_pdf_path") or metadata.get("pdf_storage_path", ""), element_id, content):
+        hasher.update(str(part).encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def _dumps_meta(value: Any) -> str:
+    try:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    except orjson.JSONEncodeError:
+        return str(value)
+
+
+def _flatten_meta(prefix: str, source: Dict[str, Any]) -> Dict[str, Any]:
+
+    flattened = {}
+    for key, value in source.items():
+        value_type = type(value)
+        if value_type in _SCALAR_TYPES:
+            flattened[f"{prefix}_{key}"] = value
+        elif value_type in _CONTAINER_TYPES:
+            flattened[f"{prefix}_{key}"] = _dumps_meta(value)
+    return flattened
+
+
+def _wait_retry_after(retry_state) -> float:
+    response = getattr(retry_state.outcome.exception(), "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), _EMBED_MAX_RETRY_WAIT)
+        except ValueError:
+            pass
+    return _backoff_with_jitter(retry_state)
+
+
+@retry(
+    stop=stop_after_attempt(5),
+    wait=_wait_retry_after,
+    retry=retry_if_exception_type(_TRANSIENT_ERRORS),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True
+)
+async def _acreate_embeddings(client: openai.AsyncOpenAI, **kwargs):
+    return await client.embeddings.create(**kwargs)
+
+
+@dataclass(frozen=True)
 class ChromaConfig:
     openai_api_key: str
     chroma_persist_directory: str = os.getenv("CHROMA_PERSIST_DIRECTORY")
@@ -17,6 +138,9 @@ class ChromaConfig:
     image_collection_name: str = os.getenv("IMAGE_COLLECTION_NAME")
     table_collection_name: str = os.getenv("TABLE_COLLECTION_NAME")
     embedding_model: str = os.getenv("EMBEDDING_MODEL_NAME")
+    embedding_dimensions: Optional[int] = int(os.getenv("EMBEDDING_DIMENSIONS")) if os.getenv("EMBEDDING_DIMENSIONS") else None
+    deduplicate_content: bool = os.getenv("DEDUPLICATE_CONTENT", "false").lower() == "true"
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "openai")
 
 
 class MultimodalChromaStore:
@@ -26,99 +150,93 @@ class MultimodalChromaStore:
         
         logger.info("Initializing ChromaDB store...")
         
-        self.embeddings = OpenAIEmbeddings(
-            model=config.embedding_model,
-            openai_api_key=config.openai_api_key
-        )
+        if config.embedding_backend == "fastembed":
+            self.embeddings = get_fastembed_backend(config.embedding_model)
+        else:
+            self.embeddings = OpenAIEmbeddings(
+                model=config.embedding_model,
+                dimensions=config.embedding_dimensions,
+                openai_api_key=config.openai_api_key
+            )
+        
+        self._client = get_persistent_client(config.chroma_persist_directory)
         
         self.text_store = Chroma(
             collection_name=config.text_collection_name,
             embedding_function=self.embeddings,
-            persist_directory=config.chroma_persist_directory
+            collection_metadata=collection_metadata_for(self._client, config.text_collection_name),
+            client=self._client
         )
         
         self.image_store = Chroma(
             collection_name=config.image_collection_name,
             embedding_function=self.embeddings,  
-            persist_directory=config.chroma_persist_directory
+            collection_metadata=collection_metadata_for(self._client, config.image_collection_name),
+            client=self._client
         )
         
         self.table_store = Chroma(
             collection_name=config.table_collection_name,
             embedding_function=self.embeddings,
-            persist_directory=config.chroma_persist_directory
+            collection_metadata=collection_metadata_for(self._client, config.table_collection_name),
+            client=self._client
         )
         
-        logger.info(f"ChromaDB initialized at: {config.chroma_persist_directory}")
-        logger.info(f"Embedding model: {config.embedding_model}")
-        logger.debug(f"Collections: text={config.text_collection_name}, images={config.image_collection_name}, tables={config.table_collection_name}")
+        self._stores = {"text": self.text_store, "image": self.image_store, "table": self.table_store}
+        
+        self._dedup_path = os.path.join(config.chroma_persist_directory, _DEDUP_DB_NAME)
+        if config.deduplicate_content:
+            with closing(sqlite3.connect(self._dedup_path)) as connection, connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS seen (hash TEXT PRIMARY KEY, chunk_id TEXT)")
+        
+        logger.info("ChromaDB initialized at: %s", config.chroma_persist_directory)
+        logger.info("Embedding model: %s via %s (dimensions: %s)", config.embedding_model, config.embedding_backend, config.embedding_dimensions or 'default')
+        logger.debug("Collections: text=%s, images=%s, tables=%s", config.text_collection_name, config.image_collection_name, config.table_collection_name)
     
     
-    def store_text_chunks(self, text_chunks: List[Dict[str, Any]], source_metadata: Dict[str, Any] = None) -> List[str]:
+    def _text_records(self, text_chunks: List[Dict[str, Any]], source_metadata: Dict[str, Any] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
 
-        if not text_chunks:
-            logger.warning("No text chunks to store")
-            return []
-        
-        logger.info(f"Storing {len(text_chunks)} text chunks...")
-        
-        documents = []
+        source_metadata = source_metadata or {}
         
         for chunk in text_chunks:
             content = chunk.get("content", "")
             
             if not content.strip():
-                logger.debug(f"Skipping empty chunk: {chunk.get('id', 'unknown')}")
+                logger.debug("Skipping empty chunk: %s", chunk.get('id', 'unknown'))
                 continue
             
             metadata = {
                 "type": "text",
                 "chunk_id": chunk.get("id", ""),
+                **source_metadata,
+                **{key: chunk[key] for key in _SOURCE_PDF_KEYS if key in chunk},
+                **_flatten_meta("chunk", chunk.get("metadata") or {}),
             }
             
-            if source_metadata:
-                metadata.update(source_metadata)
-            
-            if "source_pdf_url" in chunk:
-                metadata["source_pdf_url"] = chunk["source_pdf_url"]
-            if "source_pdf_path" in chunk:
-                metadata["source_pdf_path"] = chunk["source_pdf_path"]
-            
-            if "metadata" in chunk:
-                chunk_meta = chunk["metadata"]
-                for key, value in chunk_meta.items():
-                    if value is not None:
-                        if isinstance(value, (str, int, float, bool)):
-                            metadata[f"chunk_{key}"] = value
-                        elif isinstance(value, (list, dict)):
-                            metadata[f"chunk_{key}"] = str(value)
-            
-            doc = Document(
-                page_content=content,
-                metadata=metadata
-            )
-            documents.append(doc)
+            yield content, metadata
+    
+    
+    def store_text_chunks(self, text_chunks: List[Dict[str, Any]], source_metadata: Dict[str, Any] = None, embeddings: Optional[List[List[float]]] = None) -> List[str]:
+
+        if not text_chunks:
+            logger.warning("No text chunks to store")
+            return []
+        
+        logger.info("Storing %s text chunks...", len(text_chunks))
         
-        if documents:
-            ids = self.text_store.add_documents(documents)
-            logger.info(f"Stored {len(ids)} text chunks successfully")
-            return ids
+        texts, metadatas = _unzip_records(self._text_records(text_chunks, source_metadata))
+        
+        if texts:
+            return self._store_records("text", texts, metadatas, embeddings)
         else:
             logger.warning("No valid text chunks to store after filtering")
         
         return []
     
     
-    def store_images(self, images: List[Dict[str, Any]], source_metadata: Dict[str, Any] = None) -> List[str]:
-       
-        if not images:
-            logger.warning("No images to store")
-            return []
-        
-        logger.info(f"Storing {len(images)} images...")
-        
-        documents = []
-        ai_description_count = 0
+    def _image_records(self, images: List[Dict[str, Any]], source_metadata: Dict[str, Any] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+
+        source_metadata = source_metadata or {}
         
         for img in images:
             content = img.get("content", "")
@@ -126,10 +244,7 @@ class MultimodalChromaStore:
             if not content.strip():
                 page = img.get("metadata", {}).get("page_number", "unknown")
                 content = f"Image from page {page}"
-                logger.debug(f"Using fallback description for image: {img.get('id', 'unknown')}")
-            
-            if img.get("ai_generated_description"):
-                ai_description_count += 1
+                logger.debug("Using fallback description for image: %s", img.get('id', 'unknown'))
             
             metadata = {
                 "type": "image",
@@ -137,121 +252,323 @@ class MultimodalChromaStore:
                 "supabase_url": img.get("supabase_url", ""),
                 "storage_path": img.get("storage_path", ""),
                 "ai_generated_description": img.get("ai_generated_description", False),
+                **source_metadata,
+                **{key: img[key] for key in _SOURCE_PDF_KEYS if key in img},
+                **_flatten_meta("img", img.get("metadata") or {}),
             }
-            
-            if source_metadata:
-                metadata.update(source_metadata)
-            
-            if "source_pdf_url" in img:
-                metadata["source_pdf_url"] = img["source_pdf_url"]
-            if "source_pdf_path" in img:
-                metadata["source_pdf_path"] = img["source_pdf_path"]
-            
-            if "metadata" in img:
-                img_meta = img["metadata"]
-                for key, value in img_meta.items():
-                    if value is not None:
-                        if isinstance(value, (str, int, float, bool)):
-                            metadata[f"img_{key}"] = value
-                        elif isinstance(value, (list, dict)):
-                            metadata[f"img_{key}"] = str(value)
-        
-            doc = Document(
-                page_content=content,
-                metadata=metadata
-            )
-            documents.append(doc)
-        
-        if documents:
-            ids = self.image_store.add_documents(documents)
-            logger.info(f"Stored {len(ids)} images successfully")
-            if ai_description_count > 0:
-                logger.info(f"  {ai_description_count}/{len(ids)} images have AI-generated descriptions")
-            return ids
         
-        return []
+            yield content, metadata
     
     
-    def store_tables(self, tables: List[Dict[str, Any]], source_metadata: Dict[str, Any] = None) -> List[str]:
-  
-        if not tables:
-            logger.warning("No tables to store")
+    def store_images(self, images: List[Dict[str, Any]], source_metadata: Dict[str, Any] = None, embeddings: Optional[List[List[float]]] = None) -> List[str]:
+       
+        if not images:
+            logger.warning("No images to store")
             return []
         
-        logger.info(f"Storing {len(tables)} tables...")
+        logger.info("Storing %s images...", len(images))
+        
+        texts, metadatas = _unzip_records(self._image_records(images, source_metadata))
         
-        documents = []
-        html_count = 0
+        if texts:
+            return self._store_records("image", texts, metadatas, embeddings)
+        
+        return []
+    
+    
+    def _table_records(self, tables: List[Dict[str, Any]], source_metadata: Dict[str, Any] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+
+        source_metadata = source_metadata or {}
         
         for table in tables:
             content = table.get("table_html") or table.get("table_text", "")
             
             if not content.strip():
-                logger.debug(f"Skipping empty table: {table.get('id', 'unknown')}")
+                logger.debug("Skipping empty table: %s", table.get('id', 'unknown'))
                 continue
             
-            has_html = bool(table.get("table_html"))
-            if has_html:
-                html_count += 1
-            
             metadata = {
                 "type": "table",
                 "table_id": table.get("id", ""),
-                "has_html": has_html,
+                "has_html": bool(table.get("table_html")),
+                **source_metadata,
+                **{key: table[key] for key in _SOURCE_PDF_KEYS if key in table},
+                **_flatten_meta("table", table.get("metadata") or {}),
             }
             
-            if source_metadata:
-                metadata.update(source_metadata)
+            yield content, metadata
+    
+    
+    def store_tables(self, tables: List[Dict[str, Any]], source_metadata: Dict[str, Any] = None, embeddings: Optional[List[List[float]]] = None) -> List[str]:
+  
+        if not tables:
+            logger.warning("No tables to store")
+            return []
+        
+        logger.info("Storing %s tables...", len(tables))
+        
+        texts, metadatas = _unzip_records(self._table_records(tables, source_metadata))
+        
+        if texts:
+            return self._store_records("table", texts, metadatas, embeddings)
+        
+        return []
+    
+    
+    def _embedding_batches(self, texts: List[str], max_tokens: int = _EMBED_MAX_TOKENS, max_items: int = _EMBED_MAX_ITEMS) -> List[List[str]]:
+
+        encoding = _get_encoding(self.config.embedding_model or "")
+        batches = []
+        batch = []
+        batch_tokens = 0
+        
+        for text in texts:
+            token_ids = encoding.encode(text, disallowed_special=())
+            if len(token_ids) > _EMBED_MAX_INPUT_TOKENS:
+                logger.debug("Truncating embedding input from %s to %s tokens", len(token_ids), _EMBED_MAX_INPUT_TOKENS)
+                token_ids = token_ids[:_EMBED_MAX_INPUT_TOKENS]
+                text = encoding.decode(token_ids)
+            tokens = len(token_ids)
+            if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += tokens
+        
+        if batch:
+            batches.append(batch)
+        
+        return batches
+    
+    
+    async def _aembed_batches(self, batches: List[List[str]], max_in_flight: int, on_batch: Optional[Callable[[int, List[List[float]]], None]] = None) -> List[List[float]]:
+
+        semaphore = asyncio.Semaphore(max_in_flight)
+        options = {"dimensions": self.config.embedding_dimensions} if self.config.embedding_dimensions else {}
+        starts = list(accumulate((len(batch) for batch in batches[:-1]), initial=0))
+        
+        async with openai.AsyncOpenAI(api_key=self.config.openai_api_key, max_retries=0) as client:
+            
+            async def embed(start: int, batch: List[str]) -> List[List[float]]:
+                async with semaphore:
+                    response = await _acreate_embeddings(client, model=self.config.embedding_model, input=batch, **options)
+                vectors = [item.embedding for item in sorted(response.data, key=attrgetter("index"))]
+                if on_batch is not None:
+                    on_batch(start, vectors)
+                return vectors
             
-            if "source_pdf_url" in table:
-                metadata["source_pdf_url"] = table["source_pdf_url"]
-            if "source_pdf_path" in table:
-                metadata["source_pdf_path"] = table["source_pdf_path"]
+            results = await asyncio.gather(*(embed(start, batch) for start, batch in zip(starts, batches)))
+        
+        return [vector for vectors in results for vector in vectors]
+    
+    
+    def _batched_embed(self, texts: List[str], max_tokens: int = _EMBED_MAX_TOKENS, max_items: int = _EMBED_MAX_ITEMS, max_in_flight: int = _EMBED_MAX_IN_FLIGHT, on_batch: Optional[Callable[[int, List[List[float]]], None]] = None) -> List[List[float]]:
+
+        if self.config.embedding_backend == "fastembed":
+            batches = [texts[start:start + max_items] for start in range(0, len(texts), max_items)]
+            logger.info("Embedding %s documents locally with FastEmbed in %s batch(es)...", len(texts), len(batches))
+            vectors = []
+            for batch in batches:
+                batch_vectors = self.embeddings.embed_documents(batch)
+                if on_batch is not None:
+                    on_batch(len(vectors), batch_vectors)
+                vectors.extend(batch_vectors)
+            return vectors
+        
+        batches = self._embedding_batches(texts, max_tokens, max_items)
+        logger.info("Embedding %s documents in %s batch(es), up to %s in flight...", len(texts), len(batches), max_in_flight)
+        return run_sync(self._aembed_batches(batches, max_in_flight, on_batch))
+    
+    
+    def _log_stored(self, doc_type: str, stored: int, flagged: int = 0) -> None:
+
+        if doc_type == "text":
+            logger.info("Stored %s text chunks successfully", stored)
+        elif doc_type == "image":
+            logger.info("Stored %s images successfully", stored)
+            if flagged > 0:
+                logger.info("  %s/%s images have AI-generated descriptions", flagged, stored)
+        elif doc_type == "table":
+            logger.info("Stored %s tables successfully", stored)
+            if flagged > 0:
+                logger.info("  %s/%s tables have HTML format", flagged, stored)
+    
+    
+    def _store_records(self, doc_type: str, texts: List[str], metadatas: List[Dict[str, Any]], embeddings: Optional[List[List[float]]] = None) -> List[str]:
+
+        if embeddings is None:
+            return self.store_documents({doc_type: zip(texts, metadatas)})[doc_type]
+        
+        ids, stored_metadatas = self._store_window({doc_type: (texts, metadatas)}, {doc_type: embeddings})[doc_type]
+        if ids:
+            self._log_stored(doc_type, len(ids), _count_flagged(doc_type, stored_metadatas))
+        return ids
+    
+    
+    def _dedup_filter(self, doc_type: str, contents: List[str], metadatas: List[Dict[str, Any]]) -> Tuple[List[int], List[Optional[str]]]:
+
+        collection = self._stores[doc_type]._collection
+        id_key = _ELEMENT_ID_KEYS[doc_type]
+        hashes = [
+            _content_hash(collection.name, metadata, metadata[id_key], content) if metadata.get(id_key) else None
+            for content, metadata in zip(contents, metadatas)
+        ]
+        unique_hashes = list(dict.fromkeys(content_hash for content_hash in hashes if content_hash))
+        known = {}
+        
+        with closing(sqlite3.connect(self._dedup_path)) as connection:
+            for start in range(0, len(unique_hashes), _SQLITE_MAX_PARAMS):
+                chunk = unique_hashes[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                known.update(connection.execute(f"SELECT hash, chunk_id FROM seen WHERE hash IN ({placeholders})", chunk))
+        
+        live_ids = set(collection.get(ids=list(known.values()), include=[])["ids"]) if known else set()
+        
+        keep = []
+        claimed = set()
+        for index, content_hash in enumerate(hashes):
+            if content_hash is None:
+                keep.append(index)
+                continue
+            if content_hash in claimed or known.get(content_hash) in live_ids:
+                continue
+            claimed.add(content_hash)
+            keep.append(index)
+        
+        return keep, hashes
+    
+    
+    def _remember_hashes(self, hashes: List[Optional[str]], ids: List[str]) -> None:
+
+        rows = [(content_hash, chunk_id) for content_hash, chunk_id in zip(hashes, ids) if content_hash]
+        if not rows:
+            return
+        
+        with closing(sqlite3.connect(self._dedup_path)) as connection, connection:
+            connection.executemany("INSERT OR REPLACE INTO seen (hash, chunk_id) VALUES (?, ?)", rows)
+    
+    
+    def _insert_batch(self, doc_type: str, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]], hashes: Optional[List[Optional[str]]]) -> None:
+
+        self._stores[doc_type]._collection.add(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas
+        )
+        if hashes:
+            self._remember_hashes(hashes, ids)
+    
+    
+    def _store_window(self, records_by_type: Dict[str, Tuple[List[str], List[Dict[str, Any]]]], embeddings_by_type: Optional[Dict[str, List[List[float]]]] = None) -> Dict[str, Tuple[List[str], List[Dict[str, Any]]]]:
+
+        if embeddings_by_type is not None:
+            for doc_type, (texts, _) in records_by_type.items():
+                if len(embeddings_by_type[doc_type]) != len(texts):
+                    raise ValueError(f"Got {len(embeddings_by_type[doc_type])} embeddings for {len(texts)} documents")
+        
+        hashes_by_type = {}
+        if self.config.deduplicate_content:
+            deduplicated = {}
+            for doc_type, (texts, metadatas) in records_by_type.items():
+                keep, hashes = self._dedup_filter(doc_type, texts, metadatas) if texts else ([], [])
+                if len(keep) < len(texts):
+                    logger.info("Skipping %s %s document(s) already in the collection", len(texts) - len(keep), doc_type)
+                deduplicated[doc_type] = ([texts[index] for index in keep], [metadatas[index] for index in keep])
+                hashes_by_type[doc_type] = [hashes[index] for index in keep]
+                if embeddings_by_type is not None:
+                    embeddings_by_type[doc_type] = [embeddings_by_type[doc_type][index] for index in keep]
+            records_by_type = deduplicated
+        
+        all_texts = [text for texts, _ in records_by_type.values() for text in texts]
+        
+        if not all_texts:
+            return {doc_type: ([], []) for doc_type in records_by_type}
+        
+        ids_by_type = {doc_type: [str(uuid.uuid4()) for _ in texts] for doc_type, (texts, _) in records_by_type.items()}
+        spans = []
+        offset = 0
+        for doc_type, (texts, _) in records_by_type.items():
+            spans.append((doc_type, offset, offset + len(texts)))
+            offset += len(texts)
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            inserts = []
             
-            if "metadata" in table:
-                table_meta = table["metadata"]
-                for key, value in table_meta.items():
-                    if value is not None:
-                        if isinstance(value, (str, int, float, bool)):
-                            metadata[f"table_{key}"] = value
-                        elif isinstance(value, (list, dict)):
-                            metadata[f"table_{key}"] = str(value)
+            def insert(start: int, vectors: List[List[float]]) -> None:
+                end = start + len(vectors)
+                for doc_type, type_start, type_end in spans:
+                    low, high = max(start, type_start), min(end, type_end)
+                    if low >= high:
+                        continue
+                    texts, metadatas = records_by_type[doc_type]
+                    first, last = low - type_start, high - type_start
+                    hashes = hashes_by_type.get(doc_type)
+                    inserts.append(executor.submit(
+                        self._insert_batch,
+                        doc_type,
+                        ids_by_type[doc_type][first:last],
+                        vectors[low - start:high - start],
+                        texts[first:last],
+                        metadatas[first:last],
+                        hashes[first:last] if hashes else None
+                    ))
             
-            doc = Document(
-                page_content=content,
-                metadata=metadata
-            )
-            documents.append(doc)
+            if embeddings_by_type is None:
+                self._batched_embed(all_texts, on_batch=insert)
+            else:
+                insert(0, [vector for doc_type in records_by_type for vector in embeddings_by_type[doc_type]])
+            
+            for future in inserts:
+                future.result()
         
-        if documents:
-            ids = self.table_store.add_documents(documents)
-            logger.info(f"Stored {len(ids)} tables successfully")
-            if html_count > 0:
-                logger.info(f"  {html_count}/{len(ids)} tables have HTML format")
-            return ids
+        return {doc_type: (ids_by_type[doc_type], metadatas) for doc_type, (_, metadatas) in records_by_type.items()}
+    
+    
+    def store_documents(self, records_by_type: Dict[str, Iterable[Tuple[str, Dict[str, Any]]]], window_size: int = _STORE_WINDOW) -> Dict[str, List[str]]:
+
+        ids_by_type = {doc_type: [] for doc_type in records_by_type}
+        flagged_by_type = dict.fromkeys(records_by_type, 0)
+        stream = ((doc_type, text, metadata) for doc_type, records in records_by_type.items() for text, metadata in records)
         
-        return []
+        for window in _windows(stream, window_size):
+            grouped = {}
+            for doc_type, text, metadata in window:
+                texts, metadatas = grouped.setdefault(doc_type, ([], []))
+                texts.append(text)
+                metadatas.append(metadata)
+            
+            for doc_type, (ids, metadatas) in self._store_window(grouped).items():
+                ids_by_type[doc_type].extend(ids)
+                flagged_by_type[doc_type] += _count_flagged(doc_type, metadatas)
+        
+        for doc_type, ids in ids_by_type.items():
+            if ids:
+                self._log_stored(doc_type, len(ids), flagged_by_type[doc_type])
+        
+        return ids_by_type
     
     
     def get_stats(self) -> Dict[str, int]:
         logger.debug("Retrieving database statistics...")
         
         try:
-            text_count = len(self.text_store.get()['ids']) if self.text_store.get() else 0
+            text_count = self.text_store._collection.count()
         except Exception as e:
-            logger.error(f"Error getting text count: {str(e)}")
+            logger.error("Error getting text count: %s", e)
             text_count = 0
         
         try:
-            image_count = len(self.image_store.get()['ids']) if self.image_store.get() else 0
+            image_count = self.image_store._collection.count()
         except Exception as e:
-            logger.error(f"Error getting image count: {str(e)}")
+            logger.error("Error getting image count: %s", e)
             image_count = 0
         
         try:
-            table_count = len(self.table_store.get()['ids']) if self.table_store.get() else 0
+            table_count = self.table_store._collection.count()
         except Exception as e:
-            logger.error(f"Error getting table count: {str(e)}")
+            logger.error("Error getting table count: %s", e)
             table_count = 0
         
         stats = {
@@ -261,20 +578,50 @@ class MultimodalChromaStore:
             "total": text_count + image_count + table_count
         }
         
-        logger.debug(f"Database stats: {stats}")
+        logger.debug("Database stats: %s", stats)
         return stats
 
 
-def store_to_chroma(extraction_result: Dict[str, Any], config: ChromaConfig, store_text: bool = True, store_images: bool = True, store_tables: bool = True) -> Dict[str, Any]:
+_store_cache: "OrderedDict[tuple, MultimodalChromaStore]" = OrderedDict()
+_store_cache_lock = threading.Lock()
+
+
+def _store_cache_key(config: ChromaConfig) -> tuple:
+    api_key_hash = hashlib.sha256((config.openai_api_key or "").encode("utf-8")).hexdigest()
+    return astuple(replace(config, openai_api_key=api_key_hash))
+
+
+def _get_store(config: ChromaConfig) -> MultimodalChromaStore:
+
+    key = _store_cache_key(config)
+    with _store_cache_lock:
+        store = _store_cache.get(key)
+        if store is None:
+            store = MultimodalChromaStore(config)
+            _store_cache[key] = store
+            while len(_store_cache) > _STORE_CACHE_SIZE:
+                _store_cache.popitem(last=False)
+        else:
+            _store_cache.move_to_end(key)
+        return store
+
+
+def clear_store_cache() -> None:
+    with _store_cache_lock:
+        _store_cache.clear()
+    logger.debug("Chroma store cache cleared")
+
+
+def store_to_chroma(extraction_result: Dict[str, Any], config: ChromaConfig, store_text: bool = True, store_images: bool = True, store_tables: bool = True, include_stats: bool = False) -> Dict[str, Any]:
    
     start_time = time.time()
     
     logger.info("="*80)
     logger.info("Starting storage to ChromaDB...")
-    logger.info(f"Store text: {store_text}, Store images: {store_images}, Store tables: {store_tables}")
+    logger.info("Store text: %s, Store images: %s, Store tables: %s", store_text, store_images, store_tables)
     logger.info("="*80)
     
-    store = MultimodalChromaStore(config)
+    store = _get_store(config)
     
     source_metadata = {
         "source_file": extraction_result.get("metadata", {}).get("source", "unknown"),
@@ -286,13 +633,13 @@ def store_to_chroma(extraction_result: Dict[str, Any], config: ChromaConfig, sto
     if "pdf_url" in extraction_result:
         source_metadata["pdf_url"] = extraction_result["pdf_url"]
         source_metadata["pdf_storage_path"] = extraction_result.get("pdf_storage_path", "")
-        logger.debug(f"Source PDF URL: {extraction_result['pdf_url'][:80]}...")
+        logger.debug("Source PDF URL: %s...", extraction_result['pdf_url'][:80])
     
     if "metadata" in extraction_result and "source_pdf" in extraction_result["metadata"]:
         pdf_info = extraction_result["metadata"]["source_pdf"]
         source_metadata["pdf_original_filename"] = pdf_info.get("original_filename", "")
         source_metadata["pdf_file_size"] = pdf_info.get("file_size", 0)
-        logger.debug(f"PDF metadata: {pdf_info.get('original_filename', 'unknown')} ({pdf_info.get('file_size', 0)} bytes)")
+        logger.debug("PDF metadata: %s (%s bytes)", pdf_info.get('original_filename', 'unknown'), pdf_info.get('file_size', 0))
     
     result = {
         "text_ids": [],
@@ -308,56 +655,68 @@ def store_to_chroma(extraction_result: Dict[str, Any], config: ChromaConfig, sto
             "bucket": extraction_result.get("metadata", {}).get("document_bucket", "")
         }
     
+    records_by_type = {}
+    
     if store_text:
         text_data = (
             extraction_result.get("text_chunks_semantic") or 
             extraction_result.get("text_chunks", [])
         )
         if text_data:
-            logger.info(f"Processing {len(text_data)} text chunks...")
-            result["text_ids"] = store.store_text_chunks(text_data, source_metadata)
+            logger.info("Processing %s text chunks...", len(text_data))
+            records_by_type["text"] = store._text_records(text_data, source_metadata)
         else:
             logger.warning("No text chunks found in extraction result")
     
     if store_images:
         images = extraction_result.get("images", [])
         if images:
-            logger.info(f"Processing {len(images)} images...")
-            result["image_ids"] = store.store_images(images, source_metadata)
+            logger.info("Processing %s images...", len(images))
+            records_by_type["image"] = store._image_records(images, source_metadata)
         else:
             logger.warning("No images found in extraction result")
     
     if store_tables:
         tables = extraction_result.get("tables", [])
         if tables:
-            logger.info(f"Processing {len(tables)} tables...")
-            result["table_ids"] = store.store_tables(tables, source_metadata)
+            logger.info("Processing %s tables...", len(tables))
+            records_by_type["table"] = store._table_records(tables, source_metadata)
         else:
             logger.warning("No tables found in extraction result")
     
+    for doc_type, ids in store.store_documents(records_by_type).items():
+        result[f"{doc_type}_ids"] = ids
+    
+    if "text" in records_by_type and not result["text_ids"]:
+        logger.warning("No new text chunks stored after filtering")
+    
+    if result["text_ids"] or result["image_ids"] or result["table_ids"]:
+        invalidate_retrieval_cache()
+
     duration = time.time() - start_time
     
     logger.info("="*80)
     logger.info("Storage Summary:")
-    logger.info(f"  Text chunks: {len(result['text_ids'])}")
-    logger.info(f"  Images: {len(result['image_ids'])}")
-    logger.info(f"  Tables: {len(result['table_ids'])}")
-    logger.info(f"  Total stored: {len(result['text_ids']) + len(result['image_ids']) + len(result['table_ids'])}")
-    logger.info(f"  Storage time: {duration:.2f}s")
+    logger.info("  Text chunks: %s", len(result['text_ids']))
+    logger.info("  Images: %s", len(result['image_ids']))
+    logger.info("  Tables: %s", len(result['table_ids']))
+    logger.info("  Total stored: %s", len(result['text_ids']) + len(result['image_ids']) + len(result['table_ids']))
+    logger.info("  Storage time: %.2fs", duration)
 
     if result["pdf_info"]:
         logger.info("Source PDF:")
-        logger.info(f"  URL: {result['pdf_info']['url'][:80]}...")
-        logger.info(f"  Bucket: {result['pdf_info']['bucket']}")
-    
-    stats = store.get_stats()
-    logger.info("Database Statistics:")
-    logger.info(f"  Text collection: {stats['text_count']} documents")
-    logger.info(f"  Image collection: {stats['image_count']} documents")
-    logger.info(f"  Table collection: {stats['table_count']} documents")
-    logger.info(f"  Total in database: {stats['total']} documents")
-    logger.info("="*80)
+        logger.info("  URL: %s...", result['pdf_info']['url'][:80])
+        logger.info("  Bucket: %s", result['pdf_info']['bucket'])
     
-    result["stats"] = stats
+    if include_stats:
+        stats = store.get_stats()
+        logger.info("Database Statistics:")
+        logger.info("  Text collection: %s documents", stats['text_count'])
+        logger.info("  Image collection: %s documents", stats['image_count'])
+        logger.info("  Table collection: %s documents", stats['table_count'])
+        logger.info("  Total in database: %s documents", stats['total'])
+        result["stats"] = stats
+    
+    logger.info("="*80)
     
     return result
\ No newline at end of file
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from core import generation
+from core.generation import GenerationConfig, MultimodalGenerator
+
+
+class _WordEncoding:
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    monkeypatch.setattr(generation, "_get_encoding", lambda model: _WordEncoding())
+
+
+def _generator(max_context_tokens):
+    generator = object.__new__(MultimodalGenerator)
+    generator.config = GenerationConfig(openai_api_key="test", model="gpt-4o-mini", max_context_tokens=max_context_tokens)
+    return generator
+
+
+def _image(i):
+    return Document(page_content="stored", metadata={"supabase_url": f"http://img/{i}", "img_page_number": 1})
+
+
+def test_context_budget_is_off_by_default():
+    assert GenerationConfig(openai_api_key="test").max_context_tokens == 0
+
+
+def test_section_budgets_redistributes_absent_sections():
+    results = {"text": [Document(page_content="t")], "tables": [Document(page_content="t")]}
+
+    budgets = _generator(1000)._section_budgets(results)
+
+    assert budgets == {"text": 750, "images": None, "tables": 250}
+
+
+def test_section_budgets_split_by_share_when_all_present():
+    results = {section: [Document(page_content="x")] for section in ("text", "images", "tables")}
+
+    budgets = _generator(1000)._section_budgets(results)
+
+    assert budgets == {"text": 600, "images": 200, "tables": 200}
+
+
+def test_section_budgets_unlimited_when_disabled_or_empty():
+    unlimited = {"text": None, "images": None, "tables": None}
+
+    assert _generator(0)._section_budgets({"text": [Document(page_content="t")]}) == unlimited
+    assert _generator(1000)._section_budgets({}) == unlimited
+
+
+def test_images_are_budgeted_on_vision_output_and_never_dropped_after_analysis():
+    generator = _generator(2100)
+    analyzed = []
+
+    async def analyze(image_urls, query, language):
+        analyzed.extend(image_urls)
+        return {i: " ".join(["word"] * generation._VISION_MAX_OUTPUT_TOKENS) for i in image_urls}
+
+    generator._aanalyze_images = analyze
+
+    context, sources = asyncio.run(generator._aformat_multimodal_context({"images": [_image(i) for i in range(3)]}, "query"))
+
+    assert analyzed == [1, 2]
+    assert [source["id"] for source in sources] == ["IMAGE-1", "IMAGE-2"]
+    assert context.count("Visual Analysis (Real-time)") == 2
+    assert generation._count_sources(sources) == {"text": 0, "images": 2, "tables": 0}
+
+
+def test_vision_cache_key_separates_detail_and_max_side():
+    keys = set()
+    for detail, max_side in (("low", 1024), ("high", 1024), ("low", 512)):
+        generator = object.__new__(MultimodalGenerator)
+        generator.config = GenerationConfig(openai_api_key="test", vision_model="gpt-4o", vision_detail=detail, vision_max_side=max_side)
+        keys.add(generator._vision_cache_key("http://img/1", "query", "English"))
+
+    assert len(keys) == 3
@@ -0,0 +1,6 @@
+from core._json_utils import loads_fenced_json
+
+
+def test_loads_fenced_json_strips_code_fences():
+    assert loads_fenced_json('```json\n[{"index": 1}]\n```') == [{"index": 1}]
+    assert loads_fenced_json('  [1, 2]  ') == [1, 2]
@@ -0,0 +1,216 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from core import retrieval
+from core.retrieval import MultimodalRetriever, RetrievalConfig, _blend_keyword_scores, _mmr_select
+
+
+def _search_returning(results):
+    return SimpleNamespace(similarity_search_by_vector_with_relevance_scores=lambda vector, k: results[:k])
+
+
+def _retriever(text=(), images=(), tables=(), keyword_rerank=False):
+    retriever = object.__new__(MultimodalRetriever)
+    retriever.config = RetrievalConfig(openai_api_key="test", keyword_rerank=keyword_rerank)
+    retriever._pool = ThreadPoolExecutor(max_workers=3)
+    retriever._embed_query = lambda query: [1.0, 0.0]
+    retriever.text_store = _search_returning(list(text))
+    retriever.image_store = _search_returning(list(images))
+    retriever.table_store = _search_returning(list(tables))
+    return retriever
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    retrieval.invalidate_retrieval_cache()
+    retrieval._embedding_cache.clear()
+    yield
+    retrieval.invalidate_retrieval_cache()
+    retrieval._embedding_cache.clear()
+
+
+def _flaky_store(docs, failures):
+
+    def search(vector, k, **kwargs):
+        if failures:
+            failures.pop()
+            raise RuntimeError("chroma unavailable")
+        return docs[:k]
+
+    return SimpleNamespace(similarity_search_by_vector=search)
+
+
+def _all_retriever(text_store, embed_query=lambda query: [1.0, 0.0]):
+    retriever = _retriever()
+    retriever.config = RetrievalConfig(openai_api_key="test", keyword_rerank=False)
+    retriever._store_key = ("test",)
+    retriever._embed_query = embed_query
+    retriever.text_store = text_store
+    retriever.image_store = _flaky_store([], [])
+    retriever.table_store = _flaky_store([], [])
+    return retriever
+
+
+def _doc(chunk_id, content="content"):
+    return Document(page_content=content, metadata={"chunk_id": chunk_id})
+
+
+def test_hybrid_ranks_by_distance_and_returns_rrf_scores():
+    near, far = _doc("near"), _doc("far")
+    retriever = _retriever(text=[(far, 0.9), (near, 0.1)])
+
+    results = retriever.retrieve_hybrid_ranked("query", k=2, text_weight=1.0)
+
+    assert [doc.metadata["chunk_id"] for doc, _, _ in results] == ["near", "far"]
+    assert results[0][1] == pytest.approx(1.0 / (retrieval._RRF_K + 1))
+    assert results[1][1] == pytest.approx(1.0 / (retrieval._RRF_K + 2))
+
+
+def test_hybrid_applies_type_weights():
+    text_doc, table_doc = _doc("text"), _doc("table")
+    retriever = _retriever(text=[(text_doc, 0.5)], tables=[(table_doc, 0.5)])
+
+    results = retriever.retrieve_hybrid_ranked("query", k=2, text_weight=0.2, table_weight=0.8)
+
+    assert [type_ for _, _, type_ in results] == ["table", "text"]
+
+
+def test_mmr_select_pure_relevance_keeps_similarity_order():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[0.7, 0.7], [1.0, 0.0], [0.99, 0.01]])
+
+    assert _mmr_select(query, candidates, k=3, lambda_mult=1.0) == [1, 2, 0]
+
+
+def test_mmr_select_prefers_diverse_candidate_over_near_duplicate():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]])
+
+    assert _mmr_select(query, candidates, k=2, lambda_mult=0.3) == [0, 2]
+
+
+def test_mmr_select_caps_at_candidate_count():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[1.0, 0.0], [0.0, 1.0]])
+
+    assert sorted(_mmr_select(query, candidates, k=5, lambda_mult=0.5)) == [0, 1]
+
+
+def test_hybrid_keyword_blend_returns_the_score_it_orders_by():
+    docs = [_doc(f"doc-{i}", "alpha" if i == 2 else "beta") for i in range(3)]
+    retriever = _retriever(text=[(doc, i / 10) for i, doc in enumerate(docs)], keyword_rerank=True)
+
+    results = retriever.retrieve_hybrid_ranked("alpha", k=3, text_weight=1.0)
+    scores = [score for _, score, _ in results]
+
+    assert scores == sorted(scores, reverse=True)
+    assert results[0][0].metadata["chunk_id"] == "doc-2"
+
+
+def test_blend_keyword_scores_is_bounded_and_noop_without_matches():
+    candidates = [[_doc("a", "alpha"), 0.02, "text"], [_doc("b", "beta"), 0.01, "text"]]
+
+    blended = _blend_keyword_scores("alpha", candidates)
+    assert blended[0][1] == pytest.approx(0.02 * (1.0 + retrieval._KEYWORD_BLEND))
+    assert blended[1][1] == pytest.approx(0.01)
+
+    assert _blend_keyword_scores("gamma", candidates) == candidates
+
+
+def test_retrieve_all_does_not_cache_a_failed_store_search():
+    retriever = _all_retriever(_flaky_store([_doc("a")], failures=[True]))
+
+    assert retriever.retrieve_all("query", k_text=1)["text"] == []
+    assert [doc.metadata["chunk_id"] for doc in retriever.retrieve_all("query", k_text=1)["text"]] == ["a"]
+
+
+def test_retrieve_all_does_not_cache_a_failed_embedding():
+    vectors = [None, [1.0, 0.0]]
+    retriever = _all_retriever(_flaky_store([_doc("a")], failures=[]), embed_query=lambda query: vectors.pop(0))
+
+    assert retriever.retrieve_all("query", k_text=1)["text"] == []
+    assert len(retriever.retrieve_all("query", k_text=1)["text"]) == 1
+
+
+def test_retrieve_all_caches_successful_candidates():
+    calls = []
+    store = _flaky_store([_doc("a")], failures=[])
+    search = store.similarity_search_by_vector
+    store.similarity_search_by_vector = lambda *args, **kwargs: calls.append(1) or search(*args, **kwargs)
+    retriever = _all_retriever(store)
+
+    retriever.retrieve_all("query", k_text=1)
+    retriever.retrieve_all("query", k_text=1)
+
+    assert len(calls) == 1
+
+
+def test_retrieve_multimodal_does_not_cache_degraded_results(monkeypatch):
+    retriever = _all_retriever(_flaky_store([_doc("a")], failures=[True]))
+    monkeypatch.setattr(retrieval, "get_retriever", lambda config: retriever)
+    config = RetrievalConfig(openai_api_key="test")
+
+    first = retrieval.retrieve_multimodal("query", config, k=1)
+    second = retrieval.retrieve_multimodal("query", config, k=1)
+
+    assert first["degraded"] and first["total_results"] == 0
+    assert not second["degraded"] and second["total_results"] == 1
+
+
+def test_retrieve_multimodal_results_do_not_alias_cached_documents(monkeypatch):
+    retriever = _all_retriever(_flaky_store([_doc("a")], failures=[]))
+    monkeypatch.setattr(retrieval, "get_retriever", lambda config: retriever)
+    config = RetrievalConfig(openai_api_key="test")
+
+    retrieval.retrieve_multimodal("query", config, k=1)["results"]["text"][0].metadata["chunk_id"] = "mutated"
+
+    assert retrieval.retrieve_multimodal("query", config, k=1)["results"]["text"][0].metadata["chunk_id"] == "a"
+    assert retriever.retrieve_all("query", k_text=1)["text"][0].metadata["chunk_id"] == "a"
+
+
+def test_query_embedding_cache_is_keyed_by_backend():
+    retrievers = []
+    for backend, vector in (("openai", [1.0]), ("fastembed", [2.0])):
+        retriever = object.__new__(MultimodalRetriever)
+        retriever.config = RetrievalConfig(openai_api_key="test", embedding_model="model", embedding_backend=backend)
+        retriever.embeddings = SimpleNamespace(embed_query=lambda query, vector=vector: vector)
+        retrievers.append(retriever)
+
+    assert [retriever._embed_query("query") for retriever in retrievers] == [[1.0], [2.0]]
+
+
+def test_prime_query_embeddings_uses_the_query_path_without_touching_stats():
+    retriever = object.__new__(MultimodalRetriever)
+    retriever.config = RetrievalConfig(openai_api_key="test", embedding_model="model", embedding_backend="fastembed")
+    retriever.embeddings = SimpleNamespace(
+        embed_documents=lambda texts: pytest.fail("documents path used to prime queries"),
+        embed_queries=lambda texts: [[float(len(text))] for text in texts],
+        embed_query=lambda text: pytest.fail("primed query embedded again")
+    )
+    before = retrieval._embedding_cache.get_stats()
+
+    assert retriever.prime_query_embeddings(["a", "bb", "a"]) == 2
+    after = retrieval._embedding_cache.get_stats()
+    assert (after["hits"], after["misses"]) == (before["hits"], before["misses"])
+
+    assert retriever._embed_query("bb") == [2.0]
+
+
+def test_collection_metadata_is_only_sent_for_new_collections(tmp_path):
+    client = retrieval.get_persistent_client(str(tmp_path))
+    client.create_collection(name="existing", metadata={"hnsw:space": "ip"})
+
+    assert retrieval.collection_metadata_for(client, "existing") is None
+    assert retrieval.collection_metadata_for(client, "missing") == retrieval.COLLECTION_METADATA
+
+
+def test_persistent_client_is_reused_after_caches_are_cleared(tmp_path):
+    client_id = id(retrieval.get_persistent_client(str(tmp_path)))
+    retrieval.clear_retriever_cache()
+    retrieval.invalidate_retrieval_cache()
+
+    assert id(retrieval.get_persistent_client(str(tmp_path))) == client_id
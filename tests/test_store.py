@@ -0,0 +1,163 @@
+import sqlite3
+from contextlib import closing
+from types import SimpleNamespace
+
+import pytest
+
+from core import store as store_module
+from core.store import ChromaConfig, MultimodalChromaStore
+
+
+class _WordEncoding:
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class _FakeCollection:
+
+    def __init__(self, name="text_collection"):
+        self.name = name
+        self.ids = set()
+        self.added = []
+
+    def get(self, ids, include):
+        return {"ids": [chunk_id for chunk_id in ids if chunk_id in self.ids]}
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.ids.update(ids)
+        self.added.extend(zip(documents, embeddings))
+
+
+@pytest.fixture
+def word_encoding(monkeypatch):
+    monkeypatch.setattr(store_module, "_get_encoding", lambda model: _WordEncoding())
+
+
+def _store(**config):
+    store = object.__new__(MultimodalChromaStore)
+    store.config = ChromaConfig(openai_api_key="test", embedding_model="text-embedding-3-small", **config)
+    return store
+
+
+def _dedup_store(tmp_path, **config):
+    store = _store(deduplicate_content=True, **config)
+    store._stores = {"text": SimpleNamespace(_collection=_FakeCollection())}
+    store._dedup_path = str(tmp_path / "dedup.sqlite3")
+    with closing(sqlite3.connect(store._dedup_path)) as connection, connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS seen (hash TEXT PRIMARY KEY, chunk_id TEXT)")
+    return store
+
+
+def test_embedding_batches_respects_item_limit(word_encoding):
+    batches = _store()._embedding_batches(["a"] * 5, max_tokens=100, max_items=2)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+def test_embedding_batches_respects_token_budget(word_encoding):
+    batches = _store()._embedding_batches(["a b c", "d e", "f g h i"], max_tokens=5, max_items=100)
+
+    assert batches == [["a b c", "d e"], ["f g h i"]]
+
+
+def test_embedding_batches_truncates_oversized_inputs(word_encoding):
+    long_text = " ".join(["word"] * (store_module._EMBED_MAX_INPUT_TOKENS + 10))
+
+    batches = _store()._embedding_batches([long_text])
+
+    assert len(batches[0][0].split()) == store_module._EMBED_MAX_INPUT_TOKENS
+
+
+def test_fastembed_path_slices_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(store_module, "_get_encoding", lambda model: pytest.fail("tiktoken used on the fastembed path"))
+    store = _store(embedding_backend="fastembed")
+    store.embeddings = SimpleNamespace(embed_documents=lambda texts: [[float(len(text))] for text in texts])
+    offsets = []
+
+    vectors = store._batched_embed(["a", "bb", "ccc"], max_items=2, on_batch=lambda start, batch: offsets.append(start))
+
+    assert vectors == [[1.0], [2.0], [3.0]]
+    assert offsets == [0, 2]
+
+
+def test_dedup_filter_drops_repeats_within_a_batch(tmp_path):
+    store = _dedup_store(tmp_path)
+    metadatas = [{"chunk_id": "c1", "source_file": "a.pdf"}, {"chunk_id": "c1", "source_file": "a.pdf"}, {"chunk_id": "c1", "source_file": "b.pdf"}]
+
+    keep, hashes = store._dedup_filter("text", ["same", "same", "same"], metadatas)
+
+    assert keep == [0, 2]
+    assert hashes[0] == hashes[1] != hashes[2]
+
+
+def test_dedup_filter_always_keeps_records_without_element_id(tmp_path):
+    store = _dedup_store(tmp_path)
+
+    keep, hashes = store._dedup_filter("text", ["placeholder", "placeholder"], [{}, {}])
+
+    assert keep == [0, 1]
+    assert hashes == [None, None]
+
+
+def test_dedup_filter_skips_only_hashes_still_in_the_collection(tmp_path):
+    store = _dedup_store(tmp_path)
+    collection = store._stores["text"]._collection
+    metadatas = [{"chunk_id": "c1"}, {"chunk_id": "c2"}]
+    _, hashes = store._dedup_filter("text", ["one", "two"], metadatas)
+    store._remember_hashes(hashes, ["id-1", "id-2"])
+    collection.ids = {"id-1"}
+
+    keep, _ = store._dedup_filter("text", ["one", "two"], metadatas)
+
+    assert keep == [1]
+
+
+def test_store_cache_reuses_stores_without_keeping_the_raw_api_key(monkeypatch):
+    monkeypatch.setattr(store_module, "MultimodalChromaStore", lambda config: SimpleNamespace(config=config))
+    store_module.clear_store_cache()
+    config = ChromaConfig(openai_api_key="sk-secret", chroma_persist_directory="/tmp/chroma")
+
+    first = store_module._get_store(config)
+
+    assert store_module._get_store(ChromaConfig(openai_api_key="sk-secret", chroma_persist_directory="/tmp/chroma")) is first
+    assert store_module._get_store(ChromaConfig(openai_api_key="sk-other", chroma_persist_directory="/tmp/chroma")) is not first
+    assert not any("sk-secret" in map(str, key) for key in store_module._store_cache)
+    store_module.clear_store_cache()
+
+
+def test_chroma_config_is_immutable():
+    config = ChromaConfig(openai_api_key="test")
+
+    with pytest.raises(AttributeError):
+        config.embedding_model = "other"
+
+
+def test_store_text_chunks_is_windowed_and_deduplicated(tmp_path):
+    store = _dedup_store(tmp_path, embedding_backend="fastembed")
+    store.embeddings = SimpleNamespace(embed_documents=lambda texts: [[1.0] for _ in texts])
+    chunks = [{"id": "c1", "content": "one"}, {"id": "c2", "content": "two"}]
+
+    first = store.store_text_chunks(chunks)
+    second = store.store_text_chunks(chunks)
+
+    assert len(first) == 2
+    assert second == []
+
+
+def test_store_text_chunks_keeps_precomputed_embeddings_aligned_after_dedup(tmp_path):
+    store = _dedup_store(tmp_path)
+    collection = store._stores["text"]._collection
+    store.store_text_chunks([{"id": "c1", "content": "one"}], embeddings=[[1.0]])
+
+    store.store_text_chunks([{"id": "c1", "content": "one"}, {"id": "c2", "content": "two"}], embeddings=[[1.0], [2.0]])
+
+    assert collection.added == [("one", [1.0]), ("two", [2.0])]
+
+
+def test_store_text_chunks_rejects_mismatched_embeddings(tmp_path):
+    with pytest.raises(ValueError):
+        _dedup_store(tmp_path).store_text_chunks([{"id": "c1", "content": "one"}], embeddings=[])